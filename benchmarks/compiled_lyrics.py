@@ -0,0 +1,56 @@
+"""Lyrics at track start: the former LRC parse versus compile_lyrics and the compiled lyrics cache. Run from anywhere: python benchmarks/compiled_lyrics.py [repeats]"""
+import os, sys, tempfile, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.compiled_lyrics import compile_lyrics, load_compiled_lyrics
+
+VERSE = ["Walking down the empty street tonight", "Every window shows a different light", "I keep the radio on low", "Singing songs that only we would know"]
+CHORUS = ["Oh, carry me home", "Over the water and over the stone", "Oh, carry me home", "I was never meant to be alone"]
+
+def make_lrc():
+    """79 lines of LRC, the chorus repeated like in most songs."""
+    lines, milliseconds = [], 12000
+
+    for part in [VERSE, CHORUS, VERSE, CHORUS, VERSE, CHORUS, CHORUS] * 3:
+        for text in part:
+            lines.append(f"[{milliseconds // 60000:02d}:{milliseconds // 1000 % 60:02d}.{milliseconds % 1000 // 10:02d}] {text}")
+            milliseconds += 2650
+
+    return "\n".join(lines[:79])
+
+def parse_synchronized_lyrics(synchronized_lyrics: str):
+    # the parser compile_lyrics replaced, it crashed on tags and blank lines, so it only gets plain timestamped lines here
+    lyrics_list = {}
+
+    for lyrics_line in synchronized_lyrics.splitlines():
+        uncleaned_date, text = lyrics_line.split("] ")
+        minutes_str, seconds_str = uncleaned_date.replace("[", "").split(":")
+        lyrics_list[float(minutes_str) * 60 + float(seconds_str)] = text
+
+    return list(lyrics_list.keys()), lyrics_list
+
+def measure(statement, repeats: int):
+    return min(timeit.repeat(statement, number=200, repeat=repeats)) / 200
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    lrc = make_lrc()
+    line_count = lrc.count("\n") + 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory) # compiled_lyrics/ is created in the working directory
+        load_compiled_lyrics(lrc)
+
+        old_time = measure(lambda: parse_synchronized_lyrics(lrc), repeats)
+        compile_time = measure(lambda: compile_lyrics(lrc), repeats)
+        cached_time = measure(lambda: load_compiled_lyrics(lrc), repeats)
+
+    print(f"{line_count} lines of LRC ({len(lrc.encode())} bytes), best of {repeats}")
+    print(f"old parse       {old_time * 1e6:.0f} us per track start, {line_count / old_time / 1e6:.2f}M lines/s")
+    print(f"compile_lyrics  {compile_time * 1e6:.0f} us, {line_count / compile_time / 1e6:.2f}M lines/s")
+    print(f"cached load     {cached_time * 1e6:.0f} us per track start")
+    print(f"compiled size   {len(compile_lyrics(lrc).to_bytes())} bytes")
+
+if __name__ == "__main__":
+    main()
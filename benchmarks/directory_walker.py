@@ -0,0 +1,70 @@
+"""Walking a nested library: os.walk + os.stat versus walk_audio_files, with a symlink loop and a hanging directory. Run from anywhere: python benchmarks/directory_walker.py [repeats]"""
+import os, sys, tempfile, time, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.directory_walker import walk_audio_files, is_audio_file, DirectoryReader
+
+def make_tree(root: str):
+    """10 artists x 10 albums x 5 discs x 20 empty files, 10000 files in 611 directories, plus a link from every artist back to the root."""
+    for artist in range(10):
+        for album in range(10):
+            for disc in range(5):
+                directory = os.path.join(root, f"Artist {artist}", f"Album {album}", f"Disc {disc}")
+                os.makedirs(directory)
+                for track in range(20):
+                    open(os.path.join(directory, f"{track:02d} Track.mp3"), "wb").close()
+
+        os.symlink(root, os.path.join(root, f"Artist {artist}", "loop"))
+
+def os_walk(root: str):
+    return [(os.path.join(directory, name), os.stat(os.path.join(directory, name))) for directory, _, names in os.walk(root) for name in names if is_audio_file(name)]
+
+def measure(function, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+
+    return statistics.median(times), result
+
+def first_file_time(root: str):
+    start_time = time.perf_counter()
+    next(walk_audio_files(root))
+    return time.perf_counter() - start_time
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root)
+
+        walk_time, walked = measure(lambda: os_walk(root), repeats)
+        scandir_time, scanned = measure(lambda: list(walk_audio_files(root)), repeats)
+        first_time = statistics.median(first_file_time(root) for _ in range(repeats))
+        symlink_time, followed = measure(lambda: list(walk_audio_files(root, follow_symlinks=True)), repeats)
+
+        print(f"{len(walked)} files, median of {repeats} runs on {os.cpu_count()} CPUs")
+        print(f"os.walk + os.stat             {walk_time * 1000:.0f} ms, whole result at the end")
+        print(f"walk_audio_files              {scandir_time * 1000:.0f} ms, {len(scanned)} files, first file after {first_time * 1000:.2f} ms")
+        print(f"walk_audio_files (symlinks)   {symlink_time * 1000:.0f} ms, {len(followed)} files, the loop is listed once")
+
+        # one artist directory stops answering, like a stuck network mount
+        list_directory = DirectoryReader.list_directory
+        hanging = os.path.join(root, "Artist 3")
+
+        def hanging_list_directory(self, directory, follow_symlinks):
+            if directory == hanging:
+                time.sleep(30)
+            return list_directory(self, directory, follow_symlinks)
+
+        DirectoryReader.list_directory = hanging_list_directory
+        start_time = time.perf_counter()
+        files = list(walk_audio_files(root, timeout=1))
+        DirectoryReader.list_directory = list_directory
+
+        print(f"one directory hanging 30 s    {time.perf_counter() - start_time:.2f} s with a 1 s timeout, {len(files)} files")
+
+if __name__ == "__main__":
+    main()
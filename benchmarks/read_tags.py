@@ -0,0 +1,50 @@
+"""Tag reading per file: the former EasyID3 + ID3 double parse versus read_tags. Run from anywhere: python benchmarks/read_tags.py [files] [repeats]"""
+import os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3
+
+from utils.id3_reader import read_tags
+
+from benchmarks.synthetic_library import make_library
+
+def read_twice(file_path: str):
+    # what read_metadata did before: one parse for the easy keys, another one for the frames
+    easyid3 = EasyID3(file_path)
+    artist, title = easyid3.get("artist"), easyid3.get("title")
+    id3 = ID3(file_path)
+    return artist, title, id3.getall("APIC"), id3.getall("TXXX")
+
+def read_once(file_path: str):
+    tags = read_tags(file_path)
+    return tags.get_easy("artist"), tags.get_easy("title"), tags.get_cover_frame(), tags.id3.getall("TXXX"), tags.info.length
+
+def measure(function, file_paths: list[str], repeats: int):
+    best_time = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for file_path in file_paths:
+            function(file_path)
+        elapsed = (time.perf_counter() - start_time) / len(file_paths)
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+    return best_time
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_paths = make_library(directory, files, covers=10)
+
+        twice_time = measure(read_twice, file_paths, repeats)
+        once_time = measure(read_once, file_paths, repeats)
+
+    print(f"{files} tagged MP3s with a cover, best of {repeats}")
+    print(f"EasyID3 + ID3:  {twice_time * 1000:.3f} ms per file, no stream info")
+    print(f"read_tags:      {once_time * 1000:.3f} ms per file, with stream info ({twice_time / once_time:.2f}x)")
+
+if __name__ == "__main__":
+    main()
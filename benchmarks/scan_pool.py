@@ -0,0 +1,52 @@
+"""Cold library scan with one worker versus a worker pool. Run from anywhere: python benchmarks/scan_pool.py [tracks] [workers]"""
+import os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.library_scan import scan_files_in_batches, stat_files, create_scan_executor, get_default_worker_count
+from utils.library_index import LibraryIndex
+from utils import thumbnail_pack
+
+from benchmarks.synthetic_library import make_library
+
+THUMB_RESOLUTION = (128, 128)
+
+def scan(file_paths: list[str], workers: int):
+    thumbnail_pack.thumbnail_pack = None # every run starts with an empty pack and index
+    for path in ["library_index.db", "thumbnail_pack.bin", "thumbnail_pack.idx"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    library_index = LibraryIndex("library_index.db")
+    executor = create_scan_executor(workers) if workers > 1 else None
+
+    start_time = time.perf_counter()
+    scanned = sum(len(batch) for batch in scan_files_in_batches(list(stat_files(file_paths)), THUMB_RESOLUTION, library_index, executor, workers))
+    cold_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    sum(len(batch) for batch in scan_files_in_batches(list(stat_files(file_paths)), THUMB_RESOLUTION, library_index, executor, workers))
+    warm_time = time.perf_counter() - start_time
+
+    if executor is not None:
+        executor.shutdown()
+    thumbnail_pack.get_thumbnail_pack().close()
+    library_index.connection.close()
+
+    return scanned, cold_time, warm_time, type(executor).__name__ if executor else "inline"
+
+def main():
+    tracks = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else get_default_worker_count()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        file_paths = make_library(os.path.join(directory, "music"), tracks)
+
+        print(f"{tracks} tracks with their own cover, {os.cpu_count()} CPUs")
+        for worker_count in sorted({1, workers}):
+            scanned, cold_time, warm_time, executor_name = scan(file_paths, worker_count)
+            print(f"{worker_count:>2} workers ({executor_name}): cold {cold_time:.2f} s, warm {warm_time:.3f} s, {scanned} files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import io, os
+
+from mutagen.id3 import ID3, TPE1, TIT2, TDRC, APIC, TXXX, WXXX
+from PIL import Image
+
+MPEG_FRAME = b"\xff\xfb\x90\x64" + bytes(413) # MPEG-1 layer III, 128 kbps, 44.1 kHz, no padding
+
+def make_cover(seed: int, size: int=500):
+    image = Image.new("RGB", (size, size), ((seed * 67) % 256, (seed * 131) % 256, (seed * 29) % 256))
+    data = io.BytesIO()
+    image.save(data, "JPEG", quality=90)
+    return data.getvalue()
+
+def make_mp3(file_path: str, artist: str, title: str, cover: bytes | None=None, frames: int=200):
+    """Writes a tagged MP3 of silent frames, about 5 seconds at the default frame count."""
+    with open(file_path, "wb") as file:
+        file.write(MPEG_FRAME * frames)
+
+    id3 = ID3()
+    id3.add(TPE1(encoding=3, text=artist))
+    id3.add(TIT2(encoding=3, text=title))
+    id3.add(TDRC(encoding=3, text="2020"))
+    id3.add(TXXX(encoding=3, desc="play_count", text="3"))
+    id3.add(WXXX(encoding=3, desc="source", url="https://example.com"))
+    if cover:
+        id3.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover))
+    id3.save(file_path)
+
+def make_library(directory: str, count: int, covers: int | None=None):
+    """Writes count tracks into directory. With covers, tracks share that many covers like albums do, otherwise every track has its own."""
+    os.makedirs(directory, exist_ok=True)
+    cover_data = [make_cover(n) for n in range(covers)] if covers else None
+    file_paths = []
+
+    for n in range(count):
+        file_path = os.path.join(directory, f"Artist {n % 10} - Track {n}.mp3")
+        make_mp3(file_path, f"Artist {n % 10}", f"Track {n}", cover_data[n % covers] if covers else make_cover(n))
+        file_paths.append(file_path)
+
+    return file_paths
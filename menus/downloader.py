@@ -7,6 +7,7 @@ from arcade.gui.experimental.focus import UIFocusGroup
 
 from utils.music_handling import adjust_volume, add_metadata_to_file
 from utils.musicbrainz_metadata import get_music_metadata
+from utils.musicbrainz_client import BACKGROUND
 from utils.acoustid_metadata import get_recording_id_from_acoustid
 from utils.constants import button_style
 from utils.preload import button_texture, button_hovered_texture
@@ -159,9 +160,9 @@ class Downloader(arcade.gui.UIView):
 
             self.yt_dl_buffer = "Caching MusicBrainz and Lyrics metadata..."
             if musicbrainz_id:
-                music_metadata, artist_metadata, album_metadata, lyrics_metadata = get_music_metadata(musicbrainz_id=musicbrainz_id)
+                music_metadata, artist_metadata, album_metadata, lyrics_metadata, _ = get_music_metadata(musicbrainz_id=musicbrainz_id, priority=BACKGROUND)
             else:
-                music_metadata, artist_metadata, album_metadata, lyrics_metadata = get_music_metadata(artist=artist, title=title)
+                music_metadata, artist_metadata, album_metadata, lyrics_metadata, _ = get_music_metadata(artist=artist, title=title, priority=BACKGROUND)
 
             self.yt_dl_buffer = "Adding missing metadata to file..."
             add_metadata_to_file("downloaded_music.mp3", [artist['musicbrainz_id'] for artist in artist_metadata.values()], artist, title, lyrics_metadata[1], music_metadata["isrc-list"], acoustid_id)
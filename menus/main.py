@@ -2,15 +2,19 @@ import random, asyncio, pypresence, time, copy, json, os, logging
 import arcade, pyglet
 
 from utils.preload import *
-from utils.constants import button_style, slider_style, audio_extensions, discord_presence_id
-from utils.utils import FakePyPresence, UIFocusTextureButton, Card, MouseAwareScrollArea, get_wordwrapped_text
-from utils.music_handling import update_last_play_statistics, extract_metadata_and_thumbnail, adjust_volume, truncate_end
-from utils.file_watching import watch_directories, watch_files
-from utils.lyrics_metadata import get_lyrics, get_closest_time, parse_synchronized_lyrics
+from utils.constants import button_style, slider_style, discord_presence_id, SCAN_FRAME_BUDGET, THUMBNAIL_MEMORY_BUDGET, LYRICS_PREFETCH_AHEAD
+from utils.utils import FakePyPresence, UIFocusTextureButton, VirtualScrollArea, VirtualScrollBar, VirtualGrid, get_wordwrapped_text
+from utils.music_handling import update_last_play_statistics, get_thumbnail_stats, adjust_volume, truncate_end
+from utils.id3_reader import read_tags
+from utils.library import get_library
+from utils.library_scan import FOREGROUND
+from utils.texture_residency import get_texture_residency
+from utils.lyrics_metadata import LyricsCursor
+from utils.lyrics_prefetch import get_lyrics_prefetcher
+from utils.compiled_lyrics import load_compiled_lyrics
 
 from thefuzz import process, fuzz
 
-from arcade.gui.experimental.scroll_area import UIScrollBar
 from arcade.gui.experimental.focus import UIFocusGroup
 
 class Main(arcade.gui.UIView):
@@ -56,12 +60,13 @@ class Main(arcade.gui.UIView):
             self.pypresence_client = FakePyPresence()
             self.pypresence_client.start_time = time.time()
 
-        self.tab_options = self.settings_dict.get("tab_options", [os.path.join("~", "Music"), os.path.join("~", "Downloads")])
-        self.tab_content = {}
-        self.playlist_content = {}
-        self.file_metadata = {}
+        self.library = get_library() # outlives this view, so coming back to Main doesn't list, scan and watch everything again
+        self.tab_options = self.library.tab_options
+        self.tab_content = self.library.tab_content
+        self.listing_requests = self.library.listing_requests
+        self.playlist_content = self.library.playlist_content
+        self.track_identities = self.library.track_identities # file_metadata and loaded_sounds are keyed by track id, the grid and queue hold paths
         self.tab_buttons = {}
-        self.music_buttons = {}
         self.queue = queue or []
 
         self.current_music_artist = current_music_artist
@@ -73,28 +78,47 @@ class Main(arcade.gui.UIView):
         self.shuffle = shuffle
         self.volume = self.settings_dict.get("default_volume", 100)
 
-        self.lyrics_times, self.parsed_lyrics = parse_synchronized_lyrics(self.current_synchronized_lyrics) if self.current_synchronized_lyrics else (None, None)
+        self.lyrics_cursor = LyricsCursor(load_compiled_lyrics(self.current_synchronized_lyrics)) if self.current_synchronized_lyrics else None
+        self.lyrics_prefetcher = get_lyrics_prefetcher()
+        self.lyrics_future = None # lyrics of the current track while a prefetch worker still resolves them
+        self.prefetched_paths = None # the upcoming tracks prefetch_lyrics handled last
+        self.shuffle_pick = None # chosen ahead of time, so its lyrics are prefetched too
+
+        if self.current_music_path and not self.current_synchronized_lyrics: # the previous view was left while they were resolving
+            track_id = self.track_identities.find_id(self.current_music_path)
+            self.lyrics_future = self.lyrics_prefetcher.get_current(self.track_identities.get_path(track_id)) if track_id is not None else None
 
         self.current_mode = current_mode if current_mode else "files"
-        self.current_tab = current_tab if current_tab else self.tab_options[0]
+        self.current_tab = current_tab if current_tab else self.settings_dict.get("tab_options", [os.path.join("~", "Music"), os.path.join("~", "Downloads")])[0]
         self.search_term = ""
         self.highest_score_file = ""
 
         self.time_to_seek = None
-        self.should_reload = False
-        
-        self.tab_observer = None
-        self.playlist_observer = None
+        self.thumbnail_stats_outdated = False
         
         self.loaded_sounds = loaded_sounds if loaded_sounds else {}
 
+        self.texture_residency = get_texture_residency(self.settings_dict.get("thumbnail_memory", THUMBNAIL_MEMORY_BUDGET // (1024 ** 2)) * 1024 ** 2)
+
     def on_show_view(self):
         super().on_show_view()
 
-        self.load_content()
+        if self.current_mode == "playlist" and not self.current_tab:
+            self.current_tab = next(iter(self.settings_dict.get("playlists", {})), None)
+
+        self.library.sync(self.settings_dict, self.get_thumb_resolution(), self.current_tab, self.current_mode)
+        self.tab_scanner = self.library.tab_scanner
+        self.file_metadata = self.library.file_metadata
+
+        self.tab_scanner.resume()
 
         self.create_ui()
-        
+
+    def on_hide_view(self):
+        super().on_hide_view()
+
+        self.tab_scanner.pause() # resumed by the next Main
+
     def create_ui(self):
         self.anchor = self.add_widget(UIFocusGroup(size_hint=(1, 1)))
 
@@ -113,21 +137,18 @@ class Main(arcade.gui.UIView):
         self.search_bar = self.content_box.add(arcade.gui.UIInputText(size_hint=(0.5, 0.04), font_size=14))
         self.search_bar.on_change = lambda e: self.search()
 
-        if self.current_mode == "playlist" and not self.current_tab:
-            self.current_tab = list(self.playlist_content.keys())[0] if self.playlist_content else None
-
         # Scrollable Sounds and Lyrics
         self.scroll_box = self.content_box.add(arcade.gui.UIBoxLayout(size_hint=(1, 0.90), space_between=15, vertical=False))
 
-        self.scroll_area = MouseAwareScrollArea(size_hint=(0.8, 1)) # center on screen
+        self.scroll_area = VirtualScrollArea(size_hint=(0.8, 1)) # center on screen
         self.scroll_area.scroll_speed = -50
         self.scroll_box.add(self.scroll_area)
 
-        self.scrollbar = UIScrollBar(self.scroll_area)
+        self.scrollbar = VirtualScrollBar(self.scroll_area)
         self.scrollbar.size_hint = (0.02, 1)
         self.scroll_box.add(self.scrollbar)
 
-        self.music_grid = arcade.gui.UIGridLayout(horizontal_spacing=10, vertical_spacing=10, row_count=99, column_count=6)
+        self.music_grid = VirtualGrid(self.scroll_area, column_count=6, card_width=self.window.width / 7, view_height=self.window.height, bind_card=self.bind_music_card, horizontal_spacing=10, vertical_spacing=10)
         self.scroll_area.add(self.music_grid)
 
         self.lyrics_box = self.scroll_box.add(arcade.gui.UIBoxLayout(space_between=5, size_hint=(0.25, 1), align="left"))
@@ -243,9 +264,10 @@ class Main(arcade.gui.UIView):
     def previous_track(self):
         if not self.current_music_player is None:
             if self.current_mode == "files":
-                if os.path.basename(self.current_music_path) in self.tab_content[self.current_tab]:
-                    current_idx = self.tab_content[self.current_tab].index(os.path.basename(self.current_music_path))
-                    self.queue.append(f"{self.current_tab}/{self.tab_content[self.current_tab][current_idx - 1]}")
+                relative_path = os.path.relpath(self.current_music_path, self.current_tab)
+                if relative_path in self.tab_content[self.current_tab]:
+                    current_idx = self.tab_content[self.current_tab].index(relative_path)
+                    self.queue.append(os.path.join(self.current_tab, self.tab_content[self.current_tab][current_idx - 1]))
             elif self.current_mode == "playlist":
                 if os.path.basename(self.current_music_path) in self.playlist_content[self.current_tab]:
                     current_idx = self.playlist_content[self.current_tab].index(os.path.basename(self.current_music_path))
@@ -256,9 +278,10 @@ class Main(arcade.gui.UIView):
     def next_track(self):
         if not self.current_music_player is None:
             if self.current_mode == "files":
-                if os.path.basename(self.current_music_path) in self.tab_content[self.current_tab]:
-                    current_idx = self.tab_content[self.current_tab].index(os.path.basename(self.current_music_path))
-                    self.queue.append(f"{self.current_tab}/{self.tab_content[self.current_tab][current_idx + 1]}")
+                relative_path = os.path.relpath(self.current_music_path, self.current_tab)
+                if relative_path in self.tab_content[self.current_tab]:
+                    current_idx = self.tab_content[self.current_tab].index(relative_path)
+                    self.queue.append(os.path.join(self.current_tab, self.tab_content[self.current_tab][current_idx + 1]))
             elif self.current_mode == "playlist":
                 if os.path.basename(self.current_music_path) in self.playlist_content[self.current_tab]:
                     current_idx = self.playlist_content[self.current_tab].index(os.path.basename(self.current_music_path))
@@ -273,7 +296,7 @@ class Main(arcade.gui.UIView):
                 return
 
             if self.settings_dict.get("music_mode", "Streaming") == "Streaming":
-                del self.loaded_sounds[self.current_music_path]
+                self.loaded_sounds.pop(self.track_identities.find_id(self.current_music_path), None)
             
             self.current_length = 0
             self.current_music_artist = None
@@ -283,8 +306,8 @@ class Main(arcade.gui.UIView):
             self.current_music_path = None
             self.progressbar.value = 0
             self.current_synchronized_lyrics = None
-            self.lyrics_times = None
-            self.parsed_lyrics = None
+            self.lyrics_cursor = None
+            self.lyrics_future = None
             self.current_lyrics_label.text = "Play a song to get lyrics."
             self.next_lyrics_label.text = "Play a song to get lyrics."
             self.current_music_artist_label.text = "No songs playing"
@@ -312,26 +335,24 @@ class Main(arcade.gui.UIView):
 
     def view_metadata(self, file_path):
         from menus.metadata_viewer import MetadataViewer
-        self.window.show_view(MetadataViewer(self.pypresence_client, "file", self.file_metadata[file_path], file_path, self.current_tab, self.current_mode, self.current_music_artist, self.current_music_title, self.current_music_path, self.current_length, self.current_music_player, self.current_synchronized_lyrics, self.queue, self.loaded_sounds, self.shuffle))
+        self.window.show_view(MetadataViewer(self.pypresence_client, "file", self.library.get_file_metadata(file_path), file_path, self.current_tab, self.current_mode, self.current_music_artist, self.current_music_title, self.current_music_path, self.current_length, self.current_music_player, self.current_synchronized_lyrics, self.queue, self.loaded_sounds, self.shuffle))
 
     def show_content(self, tab, content_type):
-        for music_button in self.music_buttons.values():
-            music_button.clear()
-            self.music_grid.remove(music_button)
-            del music_button
-
-        self.music_grid.clear()
-        self.music_buttons.clear()
+        if tab != self.current_tab:
+            self.shuffle_pick = None
 
         self.current_tab = tab
         self.current_mode = content_type
 
+        if not tab in (self.tab_content if content_type == "files" else self.playlist_content):
+            self.library.request_scan(tab, content_type, FOREGROUND)
+
         original_content = self.tab_content[tab] if self.current_mode == "files" else self.playlist_content[tab]
 
         if not self.search_term == "":
             matches = process.extract(self.search_term, original_content, limit=5, processor=lambda text: text.lower(), scorer=fuzz.partial_token_sort_ratio)
             if matches:
-                self.highest_score_file = f"{self.current_tab}/{matches[0][0]}"
+                self.highest_score_file = os.path.join(self.current_tab, matches[0][0]) if self.current_mode == "files" else matches[0][0]
                 content_to_show = [match[0] for match in matches]
             else:
                 self.highest_score_file = ""
@@ -339,37 +360,34 @@ class Main(arcade.gui.UIView):
 
         else:
             self.highest_score_file = ""
-            self.no_music_label.visible = not original_content
+            self.no_music_label.visible = not original_content and not tab in self.listing_requests
             content_to_show = original_content
 
-        n = 0
-        row, col = 0, 0
-
-        for n, music_filename in enumerate(content_to_show):
-            row = n // self.music_grid.column_count
-            col = n % self.music_grid.column_count
+        if self.current_mode == "files":
+            music_paths = [os.path.join(tab, relative_path) for relative_path in content_to_show]
+        else:
+            music_paths = list(content_to_show)
 
-            if self.current_mode == "files":
-                music_path = f"{tab}/{music_filename}"
-            else:
-                music_path = music_filename
+        if self.current_mode == "playlist":
+            music_paths.append("add_music")
 
-            metadata = self.file_metadata[music_path]
-            
-            self.music_buttons[music_path] = self.music_grid.add(Card(metadata["thumbnail"], get_wordwrapped_text(metadata["title"]), get_wordwrapped_text(metadata["artist"]), width=self.window.width / (self.music_grid.column_count + 1), height=self.window.width / (self.music_grid.column_count + 1)), row=row, column=col)
-            self.music_buttons[music_path].button.on_click = lambda event, music_path=music_path: self.music_button_click(event, music_path)
+        self.music_grid.set_items(music_paths) # only the Cards in view get (re-)bound, see bind_music_card
 
-        row = (n + 1) // self.music_grid.column_count
-        col = (n + 1) % self.music_grid.column_count
+        self.anchor.detect_focusable_widgets()
 
-        self.music_grid.row_count = row + 1
-        self.music_grid._update_size_hints()
+    def bind_music_card(self, card, music_path):
+        if music_path == "add_music":
+            card.set_content(music_icon, "Add Music", None)
+            card.button.on_click = lambda event: self.add_music()
+            return
 
-        if self.current_mode == "playlist":
-            self.music_buttons["add_music"] = self.music_grid.add(Card(music_icon, "Add Music", None, width=self.window.width / (self.music_grid.column_count + 1), height=self.window.width / (self.music_grid.column_count + 1)), row=row, column=col)
-            self.music_buttons["add_music"].button.on_click = lambda event: self.add_music()
+        metadata = self.library.get_metadata(music_path)
 
-        self.anchor.detect_focusable_widgets()
+        if metadata is None: # placeholder until the background scan reaches this file
+            card.set_content(music_icon, get_wordwrapped_text(os.path.splitext(os.path.basename(music_path))[0], max_lines=3), "Loading...")
+        else:
+            card.set_content(self.get_thumbnail(metadata), get_wordwrapped_text(metadata["title"], max_lines=3), get_wordwrapped_text(metadata["artist"], max_lines=2))
+        card.button.on_click = lambda event, music_path=music_path: self.music_button_click(event, music_path)
 
     def music_button_click(self, event, music_path):
         if event.button == arcade.MOUSE_BUTTON_LEFT:
@@ -377,64 +395,77 @@ class Main(arcade.gui.UIView):
         elif event.button == arcade.MOUSE_BUTTON_RIGHT:
             if self.current_mode == "files":
                 os.remove(music_path)
+                self.apply_library_changes(*self.library.apply_file_changes([("delete", music_path)])) # the watcher reports it again later, which is a no-op then
             elif self.current_mode == "playlist":
-                self.settings_dict["playlists"][self.current_tab].remove(music_path)
-
-                with open("settings.json", "w") as file:
-                    file.write(json.dumps(self.settings_dict, indent=4))
+                self.library.remove_from_playlist(self.current_tab, music_path)
+                self.music_grid.remove_item(music_path)
 
-            self.window.show_view(Main(self.pypresence_client, self.current_tab, self.current_mode, self.current_music_artist, self.current_music_title, self.current_music_path, self.current_length, self.current_music_player, self.current_synchronized_lyrics, self.queue, self.loaded_sounds, self.shuffle))
+                if not self.search_term:
+                    self.no_music_label.visible = not self.playlist_content[self.current_tab]
             
-    def load_content(self):
-        self.tab_content.clear()
-        self.playlist_content.clear()
-        self.file_metadata.clear()
-        
-        for tab in self.tab_options:
-            expanded_tab = os.path.expanduser(tab)
+    def apply_listings(self):
+        for tab, file_paths, done in self.library.apply_listings():
+            if self.current_mode == "files" and self.current_tab == tab and not self.search_term:
+                self.music_grid.add_items(file_paths)
 
-            if not os.path.exists(expanded_tab) or not os.path.isdir(expanded_tab):
-                self.tab_options.remove(tab)
-                continue
-                    
-            self.tab_content[expanded_tab] = []
-
-            for filename in os.listdir(expanded_tab):
-                if filename.split(".")[-1] in audio_extensions:
-                    if f"{expanded_tab}/{filename}" not in self.file_metadata:
-                        self.file_metadata[f"{expanded_tab}/{filename}"] = extract_metadata_and_thumbnail(f"{expanded_tab}/{filename}", (int(self.window.width / 16), int(self.window.height / 9)))
-                    self.tab_content[expanded_tab].append(filename)
-
-        if self.tab_observer:
-            self.tab_observer.stop()
-        self.tab_observer = watch_directories(self.tab_content.keys(), self.on_file_change)
-
-        playlist_files = []
-        for playlist, content in self.settings_dict.get("playlists", {}).items():
-            for file in content:
-                playlist_files.append(file)
-
-                if not os.path.exists(file) or not os.path.isfile(file):
-                    content.remove(file) # also removes reference from self.settings_dict["playlists"]
-                    continue
-                
-                if file not in self.file_metadata:
-                    self.file_metadata[file] = extract_metadata_and_thumbnail(file, (int(self.window.width / 16), int(self.window.height / 9)))
-            self.playlist_content[playlist] = content
-
-        if self.playlist_observer:
-            self.playlist_observer.stop()
-        self.playlist_observer = watch_files(playlist_files, self.on_file_change)
-
-    def on_file_change(self, event_type, path):
-        self.should_reload = True # needed because the observer runs in another thread and OpenGL is single-threaded.
+                if done:
+                    self.no_music_label.visible = not self.tab_content[tab]
+
+    def apply_scan_results(self):
+        self.refresh_tracks(self.library.apply_scan_results(SCAN_FRAME_BUDGET))
+        self.thumbnail_stats_outdated = True
+
+    def log_thumbnail_stats(self):
+        self.thumbnail_stats_outdated = False
+
+        stats = get_thumbnail_stats(self.file_metadata.values(), self.get_thumb_resolution())
+        logging.debug(f"Thumbnails: {stats['unique_covers']} unique of {stats['total_covers']} covers, {stats['textures']} textures resident in {stats['resident_bytes'] / (1024 ** 2):.2f} MiB, {stats['atlas_bytes_saved'] / (1024 ** 2):.2f} MiB of atlas saved, {stats['texture_loads']} loads and {stats['texture_evictions']} evictions, {stats['pack_hits']} pack hits and {stats['pack_misses']} misses")
+
+    def refresh_tracks(self, track_ids):
+        if track_ids:
+            self.music_grid.refresh_matching(lambda music_path: self.track_identities.ids.get(music_path) in track_ids)
+
+    def get_thumbnail(self, metadata):
+        """The resident texture of a track's cover, or music_icon while it is loaded in the next frames."""
+        if not metadata.get("cover_hash"):
+            return music_icon
+
+        return self.texture_residency.get(metadata["cover_hash"], self.get_thumb_resolution()) or music_icon
+
+    def apply_loaded_thumbnails(self):
+        loaded_covers = self.texture_residency.load_pending(SCAN_FRAME_BUDGET)
+
+        if loaded_covers:
+            self.music_grid.refresh_matching(lambda music_path: self.file_metadata.get(self.track_identities.ids.get(music_path), {}).get("cover_hash") in loaded_covers)
+
+            current_metadata = self.library.get_metadata(self.current_music_path) if self.current_music_path else None
+            if current_metadata and current_metadata.get("cover_hash") in loaded_covers:
+                self.current_music_thumbnail_image.texture = self.get_thumbnail(current_metadata)
+
+        self.texture_residency.compact(self.window.ctx.default_atlas)
+
+    def get_thumb_resolution(self):
+        return (int(self.window.width / 16), int(self.window.height / 9))
+
+    def apply_library_changes(self, removed, added, updated_ids):
+        for music_path in removed:
+            self.music_grid.remove_item(music_path)
+
+        for tab, music_path in added:
+            if self.current_mode == "files" and self.current_tab == tab and not self.search_term:
+                self.music_grid.add_item(music_path)
+
+        self.refresh_tracks(updated_ids)
+
+        if not self.search_term:
+            self.no_music_label.visible = not (self.tab_content.get(self.current_tab) if self.current_mode == "files" else self.playlist_content.get(self.current_tab))
 
     def load_tabs(self):
         for tab in self.tab_options:
             self.tab_buttons[os.path.expanduser(tab)] = self.tab_box.add(arcade.gui.UITextureButton(texture=button_texture, texture_hovered=button_hovered_texture, text=os.path.basename(os.path.normpath(os.path.expanduser(tab))), style=button_style, width=self.window.width / 15, height=self.window.height / 15))
             self.tab_buttons[os.path.expanduser(tab)].on_click = lambda event, tab=os.path.expanduser(tab): self.show_content(os.path.expanduser(tab), "files")
         
-        for playlist in self.playlist_content:
+        for playlist in self.settings_dict.get("playlists", {}):
             self.tab_buttons[playlist] = self.tab_box.add(arcade.gui.UITextureButton(texture=button_texture, texture_hovered=button_hovered_texture, text=playlist, style=button_style, width=self.window.width / 15, height=self.window.height / 15))
             self.tab_buttons[playlist].on_click = lambda event, playlist=playlist: self.show_content(playlist, "playlist")
 
@@ -454,72 +485,90 @@ class Main(arcade.gui.UIView):
             self.current_music_player.volume = self.volume / 100
 
     def on_update(self, delta_time):
-        if self.current_synchronized_lyrics:
-            closest_lyrics_time = get_closest_time(self.current_music_player.time, self.lyrics_times)
-            self.current_lyrics_label.text = self.parsed_lyrics.get(closest_lyrics_time, '[Music]') or '[Music]'
+        if self.lyrics_future and self.lyrics_future.done():
+            self.apply_resolved_lyrics()
+
+        if self.lyrics_cursor and self.lyrics_cursor.update(self.current_music_player.time): # seeks included, labels are only laid out again when the line changes
+            self.current_lyrics_label.text = self.lyrics_cursor.get_current_line()
             self.current_lyrics_label.fit_content()
 
-            if closest_lyrics_time in self.lyrics_times:
-                next_lyrics_times = self.lyrics_times[self.lyrics_times.index(closest_lyrics_time) + 1:self.lyrics_times.index(closest_lyrics_time) + 11]
-                self.next_lyrics_label.text = '\n'.join([self.parsed_lyrics[next_lyrics_time] for next_lyrics_time in next_lyrics_times])
-            else:
-                self.next_lyrics_label.text = '\n'.join(list(self.parsed_lyrics.values())[0:10])
+            self.next_lyrics_label.text = self.lyrics_cursor.get_next_lines(10)
             self.next_lyrics_label.fit_content()
 
-        if self.should_reload:
-            self.should_reload = False
-            self.reload()
+        while self.library.file_changes:
+            self.apply_library_changes(*self.library.apply_file_changes(self.library.file_changes.popleft()))
+
+        if self.tab_scanner.listings:
+            self.apply_listings()
+
+        if self.tab_scanner.results:
+            self.apply_scan_results()
+        elif self.thumbnail_stats_outdated and not self.tab_scanner.scanning: # once per finished scan
+            self.log_thumbnail_stats()
+
+        if self.texture_residency.pending:
+            self.apply_loaded_thumbnails()
 
         if self.current_music_player is None or self.current_music_player.time == 0:
             if len(self.queue) > 0:
                 music_path = self.queue.pop(0)
 
-                artist, title = self.file_metadata[music_path]["artist"], self.file_metadata[music_path]["title"]
+                metadata = self.library.get_file_metadata(music_path)
+                artist, title = metadata["artist"], metadata["title"]
+
+                track_id = self.track_identities.get_id(music_path)
+                real_path = self.track_identities.get_path(track_id)
+
+                self.current_synchronized_lyrics = None
+                self.lyrics_cursor = None
+                self.lyrics_future = self.lyrics_prefetcher.take(real_path, artist, title) # usually resolved already, see prefetch_lyrics
+
+                tags = read_tags(real_path, with_info=False) # parsed once, shared by normalization and play statistics
 
                 if self.settings_dict.get("normalize_audio", True):
                     self.current_music_title_label.text = "Normalizing audio..."
                     self.window.draw(delta_time) # draw before blocking
                     try:
-                        adjust_volume(music_path, self.settings_dict.get("normalized_volume", -8))
+                        adjust_volume(real_path, self.settings_dict.get("normalized_volume", -8), tags)
                     except Exception as e:
                         logging.error(f"Couldn't normalize volume for {music_path}: {e}")
 
-                update_last_play_statistics(music_path)
+                update_last_play_statistics(real_path, tags)
 
                 self.current_music_artist = artist
                 self.current_music_title = title
                 self.current_music_title_label.text = truncate_end(title, int(self.window.width / 50))
                 self.current_music_artist_label.text = truncate_end(artist, int(self.window.width / 50))
                 self.current_music_path = music_path
-                self.current_music_thumbnail_image.texture = self.file_metadata[music_path]["thumbnail"]
+                self.current_music_thumbnail_image.texture = self.get_thumbnail(metadata)
                 self.time_label.text = "00:00"
                 self.full_length_label.text = "00:00"
-                self.current_synchronized_lyrics = get_lyrics(self.current_music_artist, self.current_music_title)[1]
-                self.lyrics_times, self.parsed_lyrics = parse_synchronized_lyrics(self.current_synchronized_lyrics) if self.current_synchronized_lyrics else (None, None)
 
-                if not self.current_synchronized_lyrics:
-                    self.current_lyrics_label.text = "No known lyrics found"
-                    self.next_lyrics_label.text = "No known lyrics found"
+                if self.lyrics_future.done(): # the cursor is ready before the first frame of the track
+                    self.apply_resolved_lyrics()
+                else:
+                    self.current_lyrics_label.text = "Loading lyrics..."
+                    self.next_lyrics_label.text = "Loading lyrics..."
 
-                if not music_path in self.loaded_sounds:
-                    self.loaded_sounds[music_path] = arcade.Sound(music_path, streaming=self.settings_dict.get("music_mode", "Stream") == "Stream")
+                if not track_id in self.loaded_sounds: # decoded once, whichever path it was queued through
+                    self.loaded_sounds[track_id] = arcade.Sound(real_path, streaming=self.settings_dict.get("music_mode", "Stream") == "Stream")
 
                 self.volume = self.settings_dict.get("default_volume", 100)
                 self.volume_slider.value = self.volume
-                self.current_music_player = self.loaded_sounds[music_path].play()
+                self.current_music_player = self.loaded_sounds[track_id].play()
                 self.current_music_player.volume = self.volume / 100
-                self.current_length = self.loaded_sounds[music_path].get_length()
+                self.current_length = self.loaded_sounds[track_id].get_length()
                 self.progressbar.max_value = self.current_length
                 self.progressbar.value = 0
             else:
                 if self.current_music_player is not None:
                     self.skip_sound() # reset properties
 
-                if self.shuffle:
-                    if self.current_mode == "files":
-                        self.queue.append(f"{self.current_tab}/{random.choice(self.tab_content[self.current_tab])}")
-                    elif self.current_mode == "playlist":
-                        self.queue.append(random.choice(self.playlist_content[self.current_tab]))
+                if self.shuffle and self.get_shuffle_pick():
+                    self.queue.append(self.shuffle_pick)
+                    self.shuffle_pick = None
+
+        self.prefetch_lyrics()
 
         if not self.current_music_player is None:
             if self.time_to_seek is not None:
@@ -533,6 +582,49 @@ class Main(arcade.gui.UIView):
                 mins, secs = divmod(self.current_length, 60)
                 self.full_length_label.text = f"{int(mins):02d}:{int(secs):02d}"
 
+    def apply_resolved_lyrics(self):
+        future, self.lyrics_future = self.lyrics_future, None
+
+        try:
+            self.current_synchronized_lyrics, compiled_lyrics, _ = future.result()
+        except Exception as e:
+            logging.error(f"Couldn't resolve lyrics for {self.current_music_path}: {e}")
+            self.current_synchronized_lyrics, compiled_lyrics = None, None
+
+        self.lyrics_cursor = LyricsCursor(compiled_lyrics) if compiled_lyrics else None
+
+        if not self.lyrics_cursor: # no lyrics, or none with a timestamp the compiler could read
+            self.current_lyrics_label.text = "No known lyrics found"
+            self.next_lyrics_label.text = "No known lyrics found"
+
+    def get_shuffle_pick(self):
+        if self.shuffle_pick is None:
+            if self.current_mode == "files" and self.tab_content.get(self.current_tab):
+                self.shuffle_pick = os.path.join(self.current_tab, random.choice(self.tab_content[self.current_tab]))
+            elif self.current_mode == "playlist" and self.playlist_content.get(self.current_tab):
+                self.shuffle_pick = random.choice(self.playlist_content[self.current_tab])
+
+        return self.shuffle_pick
+
+    def prefetch_lyrics(self):
+        """Resolves the lyrics of the next queued tracks, and of the next shuffle pick, on prefetch workers."""
+        upcoming_paths = self.queue[:LYRICS_PREFETCH_AHEAD]
+        if self.shuffle and len(upcoming_paths) < LYRICS_PREFETCH_AHEAD and self.get_shuffle_pick():
+            upcoming_paths.append(self.shuffle_pick)
+
+        if upcoming_paths == self.prefetched_paths:
+            return
+
+        for music_path in upcoming_paths:
+            metadata = self.library.get_metadata(music_path)
+            if metadata is None: # not scanned yet, resolved when it starts instead
+                continue
+
+            if not self.lyrics_prefetcher.prefetch(self.track_identities.get_path(self.track_identities.get_id(music_path)), metadata["artist"], metadata["title"]):
+                return # too many in flight, tried again next frame
+
+        self.prefetched_paths = upcoming_paths
+
     def on_key_press(self, symbol: int, modifiers: int) -> bool | None:
         if symbol == arcade.key.SPACE:
             self.pause_start()
@@ -604,16 +696,6 @@ class Main(arcade.gui.UIView):
         self.ui.clear()
         self.window.show_view(Downloader(self.pypresence_client, self.current_tab, self.current_mode, self.current_music_artist, self.current_music_title, self.current_music_path, self.current_length, self.current_music_player, self.current_synchronized_lyrics, self.queue, self.loaded_sounds, self.shuffle))
 
-    def reload(self):
-        self.load_content()
-
-        if self.current_mode == "files":
-            self.show_content(os.path.expanduser(self.current_tab), "files")
-        elif self.current_mode == "playlist":
-            self.show_content(self.current_tab, "playlist")
-
-        self.anchor.detect_focusable_widgets()
-
     def update_presence(self, _):
         if self.current_music_title != "No songs playing" and self.current_music_player:
             details = f"Listening to {self.current_music_artist} - {self.current_music_title}"
@@ -35,16 +35,16 @@ class MetadataViewer(arcade.gui.UIView):
                 self.acoustid_id, musicbrainz_id = None, None
 
             if self.acoustid_id and musicbrainz_id:
-                self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata = get_music_metadata(musicbrainz_id=musicbrainz_id)
+                self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata, self.metadata_times = get_music_metadata(musicbrainz_id=musicbrainz_id)
                 return
             
-            self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata = get_music_metadata(artist=self.artist, title=self.title)
+            self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata, self.metadata_times = get_music_metadata(artist=self.artist, title=self.title)
             
         elif metadata_type == "music":
             self.artist = metadata["artist"]
             self.title = metadata["title"]
 
-            self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata = get_music_metadata(musicbrainz_id=metadata["id"])
+            self.music_metadata, self.artist_metadata, self.album_metadata, self.lyrics_metadata, self.metadata_times = get_music_metadata(musicbrainz_id=metadata["id"])
         elif metadata_type == "artist":
             self.artist_metadata = metadata
         elif metadata_type == "album":
@@ -0,0 +1,55 @@
+import os, tempfile, time, unittest
+
+from utils import compiled_lyrics
+from utils.compiled_lyrics import compile_lyrics, trim_compiled_lyrics
+from utils.constants import DAY
+
+class CompiledLyricsTest(unittest.TestCase):
+    def test_compile(self):
+        lyrics = compile_lyrics("[ar:Artist]\n[00:01.50][00:10.00] Chorus\n\n[00:05.00] Verse <00:05.50>word\n")
+
+        self.assertEqual(list(lyrics.offsets), [1500, 5000, 10000])
+        self.assertEqual([lyrics.get_line(n) for n in range(len(lyrics))], ["Chorus", "Verse word", "Chorus"])
+        self.assertEqual(len(lyrics.texts), 2)
+
+class TrimCompiledLyricsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        now = time.time()
+
+        for n in range(10): # file 0 was loaded last, 9 longest ago
+            path = os.path.join(self.directory.name, f"{n}.lrcc")
+            with open(path, "wb") as file:
+                file.write(bytes(100))
+            os.utime(path, (now - n * 60, now - n * 60))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_remaining(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_entry_limit_keeps_recently_loaded(self):
+        self.assertEqual(trim_compiled_lyrics(self.directory.name, max_entries=4), 6)
+        self.assertEqual(self.get_remaining(), ["0.lrcc", "1.lrcc", "2.lrcc", "3.lrcc"])
+
+    def test_size_limit(self):
+        max_size = compiled_lyrics.compiled_lyrics_policy.max_size
+        compiled_lyrics.compiled_lyrics_policy.max_size = 350
+        try:
+            trim_compiled_lyrics(self.directory.name)
+        finally:
+            compiled_lyrics.compiled_lyrics_policy.max_size = max_size
+
+        self.assertEqual(self.get_remaining(), ["0.lrcc", "1.lrcc", "2.lrcc"])
+
+    def test_ttl(self):
+        expired_path = os.path.join(self.directory.name, "9.lrcc")
+        expired_time = time.time() - compiled_lyrics.compiled_lyrics_policy.ttl - DAY
+        os.utime(expired_path, (expired_time, expired_time))
+
+        self.assertEqual(trim_compiled_lyrics(self.directory.name), 1)
+        self.assertNotIn("9.lrcc", self.get_remaining())
+
+if __name__ == "__main__":
+    unittest.main()
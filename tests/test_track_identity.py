@@ -0,0 +1,48 @@
+import os, tempfile, unittest
+
+from utils.track_identity import TrackIdentities
+
+def get_zeroed_stat(file_path: str):
+    """A stat like os.DirEntry.stat() gives on Windows, without device and inode number."""
+    stat = os.stat(file_path)
+    return os.stat_result((stat.st_mode, 0, 0, stat.st_nlink, stat.st_uid, stat.st_gid, stat.st_size, int(stat.st_atime), int(stat.st_mtime), int(stat.st_ctime)))
+
+class TrackIdentitiesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+
+        for name in ["a.mp3", "b.mp3"]:
+            path = os.path.join(self.directory.name, name)
+            with open(path, "wb") as file:
+                file.write(name.encode())
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_zeroed_stats_keep_files_apart(self):
+        track_identities = TrackIdentities()
+        first_id, second_id = [track_identities.get_id(path, get_zeroed_stat(path)) for path in self.paths]
+
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual(track_identities.get_path(first_id), os.path.realpath(self.paths[0]))
+        self.assertEqual(track_identities.get_path(second_id), os.path.realpath(self.paths[1]))
+
+    def test_zeroed_stat_matches_full_stat(self):
+        track_identities = TrackIdentities()
+
+        self.assertEqual(track_identities.get_id(self.paths[0], get_zeroed_stat(self.paths[0])), TrackIdentities().get_id(self.paths[0], os.stat(self.paths[0])))
+
+    def test_aliases_share_an_id(self):
+        link_path = os.path.join(self.directory.name, "link.mp3")
+        try:
+            os.symlink(self.paths[0], link_path)
+        except (OSError, NotImplementedError):
+            self.skipTest("symlinks aren't available")
+
+        track_identities = TrackIdentities()
+        self.assertEqual(track_identities.get_id(link_path), track_identities.get_id(self.paths[0]))
+
+if __name__ == "__main__":
+    unittest.main()
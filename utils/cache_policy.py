@@ -0,0 +1,27 @@
+import time
+
+class CachePolicy():
+    """Size cap and time to live of one cache namespace, with its hit, miss and eviction counts.
+    Entries past the ttl count as missing, the least recently used ones go once the namespace is over max_size."""
+    def __init__(self, max_size: int, ttl: float | None=None):
+        self.max_size = max_size
+        self.ttl = ttl # seconds, None keeps entries until they are evicted for space
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_expired(self, stored_time: float, now: float | None=None):
+        return self.ttl is not None and (now or time.time()) - stored_time > self.ttl
+
+    def get_expiry_time(self, now: float | None=None):
+        """Entries stored before this are expired."""
+        return (now or time.time()) - self.ttl if self.ttl is not None else None
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0}
+
+    def format_stats(self):
+        stats = self.get_stats()
+        return f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate'] * 100:.0f}% hit rate), {stats['evictions']} evictions"
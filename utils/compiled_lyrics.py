@@ -0,0 +1,175 @@
+import os, re, sys, time, array, struct, hashlib, logging, threading
+
+from utils.constants import COMPILED_LYRICS_DIR, COMPILED_LYRICS_MAX_SIZE, COMPILED_LYRICS_MAX_ENTRIES, COMPILED_LYRICS_TTL, COMPILED_LYRICS_TRIM_INTERVAL
+from utils.cache_policy import CachePolicy
+
+TIMESTAMP = r"\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]" # mm:ss, mm:ss.x, mm:ss.xx, mm:ss.xxx or mm:ss:xx
+LINE_PATTERN = re.compile(rf"^[ \t]*{TIMESTAMP}((?:\[\d+:\d{{1,2}}(?:[.:]\d{{1,3}})?\])*)([^\n]*)", re.MULTILINE) # a timestamp, more timestamps, the text
+TIMESTAMP_PATTERN = re.compile(TIMESTAMP)
+OFFSET_PATTERN = re.compile(r"^[ \t]*\[offset:[ \t]*([+-]?\d+)[ \t]*\]", re.MULTILINE | re.IGNORECASE)
+WORD_TIMESTAMP_PATTERN = re.compile(r"<\d+:\d{1,2}(?:[.:]\d{1,3})?>") # enhanced LRC word timings, not shown
+
+# lookups instead of padding and int() for every line, the fraction can be tenths, hundredths or milliseconds
+SECOND_MILLISECONDS = {**{str(n): n * 1000 for n in range(100)}, **{f"{n:02}": n * 1000 for n in range(100)}}
+FRACTION_MILLISECONDS = {"": 0, **{str(n): n * 100 for n in range(10)}, **{f"{n:02}": n * 10 for n in range(100)}, **{f"{n:03}": n for n in range(1000)}}
+
+HEADER = struct.Struct("<4sIIc") # magic, line count, text count, text id typecode
+MAGIC = b"LRC1"
+
+class CompiledLyrics():
+    """Synchronized lyrics as sorted millisecond offsets and, per offset, an index into a table of unique line texts."""
+    def __init__(self, offsets: array.array, text_ids: array.array, texts: list[str]):
+        self.offsets = offsets
+        self.text_ids = text_ids
+        self.texts = texts
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get_line(self, index: int):
+        return self.texts[self.text_ids[index]]
+
+    def to_bytes(self):
+        offsets, text_ids = array.array("I", self.offsets), array.array(self.text_ids.typecode, self.text_ids)
+        if sys.byteorder == "big": # stored little-endian, like the header
+            offsets.byteswap()
+            text_ids.byteswap()
+
+        return HEADER.pack(MAGIC, len(self.offsets), len(self.texts), self.text_ids.typecode.encode()) + offsets.tobytes() + text_ids.tobytes() + "\n".join(self.texts).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        magic, line_count, text_count, typecode = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not compiled lyrics")
+
+        offsets = array.array("I")
+        offsets.frombytes(data[HEADER.size:HEADER.size + line_count * offsets.itemsize])
+        position = HEADER.size + line_count * offsets.itemsize
+
+        text_ids = array.array(typecode.decode())
+        text_ids.frombytes(data[position:position + line_count * text_ids.itemsize])
+        position += line_count * text_ids.itemsize
+
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            text_ids.byteswap()
+
+        texts = data[position:].decode("utf-8").split("\n") if text_count else []
+        if len(texts) != text_count:
+            raise ValueError("Truncated compiled lyrics")
+
+        return cls(offsets, text_ids, texts)
+
+def compile_lyrics(synchronized_lyrics: str):
+    """Compiles LRC text. Handles tags like [ar:...] and [offset:...], several timestamps per line, enhanced word timings and blank or malformed lines."""
+    if "\r" in synchronized_lyrics:
+        synchronized_lyrics = synchronized_lyrics.replace("\r\n", "\n").replace("\r", "\n")
+
+    offset_tag = OFFSET_PATTERN.search(synchronized_lyrics) if "offset:" in synchronized_lyrics.lower() else None
+    offset = int(offset_tag.group(1)) if offset_tag else 0 # a positive offset shows the lyrics earlier
+
+    entries = []
+
+    # lines that don't start with a timestamp (tags, blank lines, noise) simply don't match
+    for minutes, seconds, fraction, more_timestamps, text in LINE_PATTERN.findall(synchronized_lyrics):
+        text = text.strip()
+        if "<" in text:
+            text = WORD_TIMESTAMP_PATTERN.sub("", text).strip()
+
+        entries.append((int(minutes) * 60000 + SECOND_MILLISECONDS[seconds] + FRACTION_MILLISECONDS[fraction], text))
+
+        if more_timestamps: # the same text at several times, like a chorus
+            for minutes, seconds, fraction in TIMESTAMP_PATTERN.findall(more_timestamps):
+                entries.append((int(minutes) * 60000 + SECOND_MILLISECONDS[seconds] + FRACTION_MILLISECONDS[fraction], text))
+
+    entries.sort(key=lambda entry: entry[0]) # stable, lines sharing a timestamp keep their order
+
+    text_table, texts = {}, []
+    offsets, text_ids = array.array("I"), []
+
+    for timestamp, text in entries:
+        text_id = text_table.get(text)
+        if text_id is None:
+            text_id = text_table[text] = len(texts)
+            texts.append(text)
+
+        offsets.append(max(0, timestamp - offset))
+        text_ids.append(text_id)
+
+    return CompiledLyrics(offsets, array.array("H" if len(texts) <= 0xFFFF else "I", text_ids), texts)
+
+def get_lyrics_hash(synchronized_lyrics: str):
+    return hashlib.blake2b(synchronized_lyrics.encode("utf-8"), digest_size=16).hexdigest()
+
+compiled_lyrics_policy = CachePolicy(COMPILED_LYRICS_MAX_SIZE, COMPILED_LYRICS_TTL) # a file's modification time is when it was last loaded
+compiled_lyrics_writes = 0 # since the last trim, the first write of a session trims too
+compiled_lyrics_lock = threading.Lock() # loaded from the prefetch workers
+
+def trim_compiled_lyrics(directory: str=COMPILED_LYRICS_DIR, max_entries: int=COMPILED_LYRICS_MAX_ENTRIES):
+    """Deletes compiled lyrics unused for longer than the ttl, then the least recently loaded ones until the directory fits the size and entry limits. Returns the amount of deleted files."""
+    if not os.path.isdir(directory):
+        return 0
+
+    files = sorted((stat.st_mtime, stat.st_size, entry.path) for entry in os.scandir(directory) if entry.is_file() for stat in [entry.stat()])
+    total_size, remaining = sum(size for _, size, _ in files), len(files)
+    now = time.time()
+    evicted = 0
+
+    for modification_time, size, path in files: # oldest first, so expired ones come first too
+        if not compiled_lyrics_policy.is_expired(modification_time, now) and total_size <= compiled_lyrics_policy.max_size and remaining <= max_entries:
+            break
+
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+        total_size -= size
+        remaining -= 1
+        evicted += 1
+
+    compiled_lyrics_policy.evictions += evicted
+    return evicted
+
+def load_compiled_lyrics(synchronized_lyrics: str):
+    """Compiled lyrics for the LRC text, from the compiled lyrics cache if they were compiled before."""
+    global compiled_lyrics_writes
+
+    path = os.path.join(COMPILED_LYRICS_DIR, f"{get_lyrics_hash(synchronized_lyrics)}.lrcc")
+
+    try:
+        with open(path, "rb") as file:
+            compiled_lyrics = CompiledLyrics.from_bytes(file.read())
+
+        os.utime(path) # loaded now, see trim_compiled_lyrics
+        compiled_lyrics_policy.hits += 1
+        return compiled_lyrics
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, struct.error) as e:
+        logging.debug(f"Compiling lyrics again, cached ones are unreadable: {e}")
+
+    compiled_lyrics_policy.misses += 1
+
+    compiled_lyrics = compile_lyrics(synchronized_lyrics)
+
+    try:
+        os.makedirs(COMPILED_LYRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(compiled_lyrics.to_bytes())
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logging.debug(f"Couldn't cache compiled lyrics: {e}")
+        return compiled_lyrics
+
+    with compiled_lyrics_lock:
+        compiled_lyrics_writes += 1
+        should_trim = compiled_lyrics_writes == 1 or compiled_lyrics_writes > COMPILED_LYRICS_TRIM_INTERVAL
+        if should_trim:
+            compiled_lyrics_writes = 1
+
+        if should_trim and trim_compiled_lyrics():
+            logging.debug(f"Compiled lyrics: {compiled_lyrics_policy.format_stats()}")
+
+    return compiled_lyrics
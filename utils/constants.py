@@ -1,4 +1,4 @@
-import arcade.color
+import arcade.color, os
 from arcade.types import Color
 from arcade.gui.widgets.buttons import UIFlatButtonStyle
 from arcade.gui.widgets.slider import UISliderStyle
@@ -11,12 +11,52 @@ view_modes = ["files", "playlist"]
 
 MUSIC_TITLE_WORD_BLACKLIST = ["compilation", "remix", "vs", "cover", "version", "instrumental", "restrung", "interlude"]
 COVER_CACHE_DIR = "cover_cache"
+COMPILED_LYRICS_DIR = "compiled_lyrics"
+LIBRARY_INDEX_PATH = "library_index.db"
+THUMBNAIL_PACK_PATH = "thumbnail_pack.bin"
+THUMBNAIL_PACK_MAX_SIZE = 256 * 1024 * 1024
+METADATA_STORE_PATH = "metadata_cache.db"
+METADATA_CACHE_JSON_PATH = "metadata_cache.json" # migrated into the metadata store once
+METADATA_FLUSH_INTERVAL = 5 # seconds between writes of new metadata store entries
+SCAN_FRAME_BUDGET = 1 / 240 # seconds per frame spent turning scan results into textures
+DIRECTORY_TIMEOUT = 5 # seconds, for slow network or FUSE mounts
+THUMBNAIL_MEMORY_BUDGET = 64 * 1024 * 1024 # bytes of thumbnail textures kept in the atlas
+ATLAS_COMPACT_EVICTIONS = 256 # evicted thumbnails before the atlas is rebuilt to reclaim their space
+LYRICS_PREFETCH_AHEAD = 3 # queued tracks whose lyrics are resolved before they start
+LYRICS_PREFETCH_IN_FLIGHT = 4
+LYRICS_PREFETCH_RESULTS = 64 # resolved lyrics kept for tracks that didn't start yet
 ACOUSTID_API_KEY = 'PuUkMEnUXf'
 LRCLIB_BASE_URL = "https://lrclib.net/api/search"
+LRCLIB_TIMEOUT = 5 # seconds
+LRCLIB_BACKOFF_BASE = 2 # seconds after the first failure, doubled after each further one
+LRCLIB_BACKOFF_MAX = 300
+DAY = 24 * 60 * 60 # seconds
+LYRICS_NOT_FOUND_TTL = 7 * DAY # until a lookup without lyrics is tried again
+METADATA_CACHE_LIMITS = { # namespace -> (max entries, seconds an entry is valid or None)
+    "query_results": (20000, 90 * DAY),
+    "recordings": (20000, 180 * DAY),
+    "artists": (5000, 180 * DAY),
+    "albums": (10000, 180 * DAY),
+    "lyrics": (20000, 365 * DAY),
+    "lyrics_not_found": (20000, LYRICS_NOT_FOUND_TTL),
+}
+COVER_CACHE_MAX_SIZE = 64 * 1024 * 1024 # bytes of cover art kept in COVER_CACHE_DIR
+COVER_CACHE_TTL = 180 * DAY # seconds a cover is kept after it was last shown
+COVER_JPEG_QUALITY = 85
+COMPILED_LYRICS_MAX_SIZE = 16 * 1024 * 1024 # bytes of compiled lyrics kept in COMPILED_LYRICS_DIR
+COMPILED_LYRICS_MAX_ENTRIES = 20000 # like the "lyrics" namespace of the metadata store
+COMPILED_LYRICS_TTL = 365 * DAY # seconds compiled lyrics are kept after they were last loaded
+COMPILED_LYRICS_TRIM_INTERVAL = 64 # new files written between two trims
+HTTP_TIMEOUT = 10 # seconds, per request unless a caller passes its own
+HTTP_MAX_IDLE_CONNECTIONS = 4 # kept open per host
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.5 # seconds before the first retry, doubled for each further one
 
 MUSICBRAINZ_PROJECT_NAME = "csd4ni3l/music-player"
 MUSCIBRAINZ_VERSION = "git"
 MUSICBRAINZ_CONTACT = "csd4ni3l@proton.me"
+MUSICBRAINZ_RATE = 1 # requests per second, see https://musicbrainz.org/doc/MusicBrainz_API/Rate_Limiting
+MUSICBRAINZ_BURST = 1
 
 DARK_GRAY = Color(45, 45, 45)
 GRAY = Color(70, 70, 70)
@@ -76,6 +116,13 @@ settings = {
         "VSync": {"type": "bool", "config_key": "vsync", "default": True},
         "FPS Limit": {"type": "slider", "min": 0, "max": 480, "config_key": "fps_limit", "default": 60},
     },
+    "Library": {
+        "Scan Workers": {"type": "slider", "min": 1, "max": 32, "config_key": "scan_workers", "default": os.cpu_count() or 4},
+        "Watcher Window (ms)": {"type": "slider", "min": 100, "max": 5000, "config_key": "watcher_window", "default": 1000},
+        "Follow Symlinks": {"type": "bool", "config_key": "follow_symlinks", "default": False},
+        "Directory Timeout (s)": {"type": "slider", "min": 1, "max": 60, "config_key": "directory_timeout", "default": DIRECTORY_TIMEOUT},
+        "Thumbnail Memory (MiB)": {"type": "slider", "min": 16, "max": 1024, "config_key": "thumbnail_memory", "default": THUMBNAIL_MEMORY_BUDGET // (1024 ** 2)},
+    },
     "Miscellaneous": {
         "Discord RPC": {"type": "bool", "config_key": "discord_rpc", "default": True},
     },
@@ -4,28 +4,103 @@ from PIL import Image
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
 
-from utils.constants import COVER_CACHE_DIR, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT, MUSICBRAINZ_PROJECT_NAME
+from utils.constants import COVER_CACHE_DIR, COVER_CACHE_MAX_SIZE, COVER_CACHE_TTL, COVER_JPEG_QUALITY, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT, MUSICBRAINZ_PROJECT_NAME
+from utils.cache_policy import CachePolicy
+from utils.http_client import get_http_client
 
 import musicbrainzngs as music_api
 
-import os, logging, arcade
+import os, time, logging, arcade
+
+class CoverCache():
+    """Cover art on disk as JPEG, at most max_size bytes of it. A cover's modification time is when it was last shown, covers unused for ttl seconds are deleted."""
+    def __init__(self, directory: str=COVER_CACHE_DIR, max_size: int=COVER_CACHE_MAX_SIZE, ttl: float=COVER_CACHE_TTL):
+        self.directory = directory
+        self.policy = CachePolicy(max_size, ttl)
+
+    def get_path(self, album_id: str, size: int, extension: str="jpg"):
+        return os.path.join(self.directory, f"{album_id}_{size}.{extension}")
+
+    def get(self, album_id: str, size: int):
+        path = self.get_path(album_id, size)
+
+        if not os.path.exists(path) and os.path.exists(self.get_path(album_id, size, "png")): # lossless RGBA from before, converted once
+            try:
+                self.put(album_id, size, Image.open(self.get_path(album_id, size, "png")))
+                os.remove(self.get_path(album_id, size, "png"))
+            except OSError as e:
+                logging.debug(f"Couldn't convert cached cover of {album_id}: {e}")
+
+        try:
+            if self.policy.is_expired(os.stat(path).st_mtime):
+                raise FileNotFoundError(path)
+
+            image = Image.open(path).convert("RGBA")
+            os.utime(path) # shown now, see trim
+        except OSError:
+            self.policy.misses += 1
+            return None
+
+        self.policy.hits += 1
+        return image
+
+    def put(self, album_id: str, size: int, image: Image.Image):
+        path = self.get_path(album_id, size)
+        os.makedirs(self.directory, exist_ok=True)
+
+        image.convert("RGB").save(f"{path}.tmp", "JPEG", quality=COVER_JPEG_QUALITY) # covers have no transparency
+        os.replace(f"{path}.tmp", path)
+
+    def trim(self):
+        """Deletes covers unused for longer than the ttl, then the least recently shown ones until the cache fits max_size. Returns the amount of deleted covers."""
+        if not os.path.isdir(self.directory):
+            return 0
+
+        covers = sorted((stat.st_mtime, stat.st_size, entry.path) for entry in os.scandir(self.directory) if entry.is_file() for stat in [entry.stat()])
+        total_size = sum(size for _, size, _ in covers)
+        now = time.time()
+        evicted = 0
+
+        for modification_time, size, path in covers: # oldest first, so expired ones come first too
+            if not self.policy.is_expired(modification_time, now) and total_size <= self.policy.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total_size -= size
+            evicted += 1
+
+        self.policy.evictions += evicted
+        return evicted
+
+cover_cache = None
+
+def get_cover_cache():
+    global cover_cache
+
+    if cover_cache is None:
+        cover_cache = CoverCache()
+
+    return cover_cache
 
 def fetch_image_bytes(url):
     try:
-        req = Request(url, headers={"User-Agent": "csd4ni3l/music-player/git python-musicbrainzngs/0.7.1 ( csd4ni3l@proton.me )"})
-        with urlopen(req, timeout=10) as resp:
-            return resp.read()
+        return get_http_client().get(url)
     except (HTTPError, URLError) as e:
         logging.debug(f"Error fetching {url}: {e}")
         return None
 
 def download_cover_art(mb_album_id, size=250):
-    path = os.path.join(COVER_CACHE_DIR, f"{mb_album_id}_{size}.png")
-    if os.path.exists(path):
-        return mb_album_id, Image.open(path)
+    cover_cache = get_cover_cache()
+
+    img = cover_cache.get(mb_album_id, size)
+    if img is not None:
+        return mb_album_id, img
 
     url = f"https://coverartarchive.org/release/{mb_album_id}/front-{size}"
     img_bytes = fetch_image_bytes(url)
@@ -34,7 +109,7 @@ def download_cover_art(mb_album_id, size=250):
 
     try:
         img = Image.open(BytesIO(img_bytes)).convert("RGBA")
-        img.save(path)
+        cover_cache.put(mb_album_id, size, img)
         return mb_album_id, img
     except Exception as e:
         logging.debug(f"Failed to decode/save image for {mb_album_id}: {e}")
@@ -42,11 +117,17 @@ def download_cover_art(mb_album_id, size=250):
 
 def download_albums_cover_art(album_ids, size=250, max_workers=5):
     music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
-    os.makedirs(COVER_CACHE_DIR, exist_ok=True)
     images = {}
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = [executor.submit(download_cover_art, album_id, size) for album_id in album_ids]
         for future in as_completed(futures):
             album_id, img = future.result()
             images[album_id] = arcade.Texture(img) if img else None
+
+    cover_cache = get_cover_cache()
+    if cover_cache.trim():
+        logging.debug(f"Cover cache: {cover_cache.policy.format_stats()}")
+
+    logging.debug(f"HTTP connections: {get_http_client().format_stats()}")
+
     return images
\ No newline at end of file
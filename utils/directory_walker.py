@@ -0,0 +1,96 @@
+import os, threading, queue, logging
+
+from utils.constants import audio_extensions, DIRECTORY_TIMEOUT
+
+def is_audio_file(filename: str):
+    return os.path.splitext(filename)[1][1:].lower() in audio_extensions
+
+class DirectoryReader():
+    """Lists directories on helper threads, so a hanging network or FUSE mount costs a timeout instead of blocking the caller."""
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.start_thread()
+
+    def start_thread(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            directory, follow_symlinks, result = self.requests.get()
+
+            try:
+                result["entries"] = self.list_directory(directory, follow_symlinks)
+            except OSError as e:
+                result["error"] = e
+
+            result["done"].set()
+
+    def list_directory(self, directory: str, follow_symlinks: bool):
+        directory_stat = os.stat(directory)
+        files, subdirectories = [], []
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+
+                try:
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        subdirectories.append(entry.path)
+                    elif is_audio_file(entry.name) and entry.is_file():
+                        # cached on the entry, the scan reuses its size and mtime instead of calling os.stat again.
+                        # On Windows it has no st_dev and st_ino, so TrackIdentities calls os.stat itself for the identity
+                        files.append((entry.path, entry.stat()))
+                except OSError: # broken symlink or removed meanwhile
+                    continue
+
+        return (directory_stat.st_dev, directory_stat.st_ino), files, subdirectories
+
+    def read(self, directory: str, follow_symlinks: bool, timeout: float):
+        result = {"done": threading.Event()}
+        self.requests.put((directory, follow_symlinks, result))
+
+        if not result["done"].wait(timeout):
+            self.start_thread() # the busy one is stuck, it rejoins once the filesystem answers
+            raise TimeoutError(f"Listing took longer than {timeout}s")
+
+        if "error" in result:
+            raise result["error"]
+
+        return result["entries"]
+
+directory_reader = None
+
+def get_directory_reader():
+    global directory_reader
+
+    if directory_reader is None:
+        directory_reader = DirectoryReader()
+
+    return directory_reader
+
+def walk_audio_files(directory: str, follow_symlinks: bool=False, timeout: float=DIRECTORY_TIMEOUT):
+    """Yields (path, stat) for every audio file below directory, one directory at a time. Symlink loops and directories that time out are skipped.
+    The stats come from os.scandir: size and mtime are reliable everywhere, st_dev and st_ino are 0 on Windows."""
+    reader = get_directory_reader()
+    visited = set() # (st_dev, st_ino) of every listed directory
+    stack = [directory]
+
+    while stack:
+        current = stack.pop()
+
+        try:
+            identity, files, subdirectories = reader.read(current, follow_symlinks, timeout)
+        except TimeoutError as e:
+            logging.warning(f"Skipped {current}: {e}")
+            continue
+        except OSError as e:
+            logging.debug(f"Couldn't list {current}: {e}")
+            continue
+
+        if identity in visited: # symlink loop, or a directory reached through two links
+            continue
+        visited.add(identity)
+
+        yield from sorted(files, key=lambda file: file[0])
+        stack.extend(sorted(subdirectories, reverse=True)) # popped in alphabetical order
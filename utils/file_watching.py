@@ -5,7 +5,9 @@ from typing import Callable
 
 from utils.constants import audio_extensions
 
-import os
+import os, threading
+
+TEMP_FILE_MARKERS = [".temp.", ".tmp.", ".part."] # yt-dlp and ffmpeg write to files like these before renaming them
 
 class DirectoryWatcher(PatternMatchingEventHandler):
     def __init__(self, trigger_function: Callable[[str, str], None]):
@@ -13,34 +15,131 @@ class DirectoryWatcher(PatternMatchingEventHandler):
         super().__init__(patterns=patterns, ignore_directories=True, case_sensitive=False)
         self.trigger_function = trigger_function
 
+    def is_audio_file(self, path: str):
+        return os.path.splitext(path)[1][1:].lower() in audio_extensions
+
     def on_created(self, event):
         self.trigger_function("create", event.src_path)
-        
+
     def on_deleted(self, event):
         self.trigger_function("delete", event.src_path)
 
-def watch_directories(directory_paths: list[str], func: Callable[[str, str], None]):
-    event_handler = DirectoryWatcher(func)
-    observer = Observer()
-    
+    def on_modified(self, event):
+        self.trigger_function("modify", event.src_path)
+
+    def on_moved(self, event):
+        # reported if either side matches the patterns, so renames from/to other extensions are checked here
+        if self.is_audio_file(event.src_path):
+            self.trigger_function("delete", event.src_path)
+        if self.is_audio_file(event.dest_path):
+            self.trigger_function("create", event.dest_path)
+
+class EventCoalescer():
+    """Collects watcher events and hands them over as one batch per window, once written files stopped growing."""
+    def __init__(self, trigger_function: Callable[[list[tuple[str, str]]], None], window: float=1.0, path_filter: Callable[[str], bool] | None=None):
+        self.trigger_function = trigger_function
+        self.window = window
+        self.path_filter = path_filter
+
+        self.pending = {} # path -> event type
+        self.sizes = {} # path -> size seen at the last flush
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def is_temp_file(self, path: str):
+        filename = os.path.basename(path).lower()
+        return filename.startswith((".", "~")) or any(marker in filename for marker in TEMP_FILE_MARKERS)
+
+    def add(self, event_type: str, path: str):
+        if self.is_temp_file(path) or (self.path_filter and not self.path_filter(path)):
+            return
+
+        with self.lock:
+            previous_event_type = self.pending.get(path)
+            self.sizes.pop(path, None) # needs a full quiet window again
+
+            if previous_event_type == "create" and event_type == "delete": # never seen by the UI, drop it
+                del self.pending[path]
+            elif previous_event_type == "create" and event_type == "modify":
+                pass
+            elif previous_event_type == "delete" and event_type == "create": # replaced
+                self.pending[path] = "modify"
+            else:
+                self.pending[path] = event_type
+
+    def flush(self):
+        changes = []
+
+        with self.lock:
+            for path, event_type in list(self.pending.items()):
+                if event_type != "delete":
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError: # vanished before we got to it
+                        del self.pending[path]
+                        if event_type == "modify":
+                            changes.append(("delete", path))
+                        continue
+
+                    if self.sizes.get(path) != size: # still being written, check again next window
+                        self.sizes[path] = size
+                        continue
+
+                del self.pending[path]
+                self.sizes.pop(path, None)
+                changes.append((event_type, path))
+
+        if changes:
+            self.trigger_function(changes)
+
+    def run(self):
+        while not self.stopped.wait(self.window):
+            self.flush()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+class CoalescingObserver(Observer):
+    def __init__(self, coalescer: EventCoalescer):
+        super().__init__()
+        self.coalescer = coalescer
+
+    def start(self):
+        super().start()
+        self.coalescer.start()
+
+    def stop(self):
+        self.coalescer.stop()
+        super().stop()
+
+def watch_directories(directory_paths: list[str], func: Callable[[list[tuple[str, str]]], None], window: float=1.0, path_filter: Callable[[str], bool] | None=None, recursive: bool=False):
+    coalescer = EventCoalescer(func, window, path_filter)
+    event_handler = DirectoryWatcher(coalescer.add)
+    observer = CoalescingObserver(coalescer)
+
     for directory_path in directory_paths:
-        observer.schedule(event_handler, path=directory_path)
+        observer.schedule(event_handler, path=directory_path, recursive=recursive)
 
     observer.start()
     return observer
 
-def file_hit(event_type: str, file_path: str, directories: dict[str, list[str]], func: Callable[[str, str], None]):
+def file_hit(file_path: str, directories: dict[str, list[str]]):
     directory = os.path.dirname(file_path)
-    if directory in directories and file_path in directories[directory]:
-        func(event_type, file_path)
+    return directory in directories and file_path in directories[directory]
 
-def watch_files(file_paths: list[str], func: Callable[[str, str], None]):
+def watch_files(file_paths: list[str], func: Callable[[list[tuple[str, str]]], None], window: float=1.0):
     directories: dict[str, list[str]] = {}
     for file_path in file_paths:
         directory = os.path.dirname(file_path)
         directories.setdefault(directory, []).append(file_path)
 
     return watch_directories(
-        list(directories.keys()),
-        lambda event_type, file_path: file_hit(event_type, file_path, directories, func)
-    )
\ No newline at end of file
+        [directory for directory in directories if os.path.isdir(directory)],
+        func,
+        window,
+        lambda file_path: file_hit(file_path, directories)
+    )
@@ -0,0 +1,216 @@
+import http.client, urllib.parse, urllib.error, urllib.request, ssl, gzip, zlib, base64, threading, time, logging
+
+from utils.constants import HTTP_TIMEOUT, HTTP_MAX_IDLE_CONNECTIONS, HTTP_RETRIES, HTTP_RETRY_BACKOFF, MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT
+
+USER_AGENT = f"{MUSICBRAINZ_PROJECT_NAME}/{MUSCIBRAINZ_VERSION} ( {MUSICBRAINZ_CONTACT} )"
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_REDIRECTS = 5
+STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, http.client.RemoteDisconnected, http.client.BadStatusLine) # what a keep-alive connection the server closed raises
+
+class HostStats():
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_latency = 0
+
+    def format(self):
+        mean_latency = self.total_latency / self.requests * 1000 if self.requests else 0
+        return f"{self.requests} requests, {self.reused_connections} on reused connections, {self.new_connections} new connections, {self.retries} retries, {self.failures} failures, {mean_latency:.1f} ms mean latency"
+
+class HTTPClient():
+    """Keeps connections to every host open between requests, so lookups after the first skip the TCP and TLS handshakes.
+    Asks for gzip, follows redirects and retries connection errors and overloaded servers with exponential backoff.
+    Honours the proxy settings urlopen used (HTTP_PROXY, HTTPS_PROXY, NO_PROXY, or the system settings on Windows and macOS), HTTPS goes through a CONNECT tunnel.
+    Safe to use from several threads, a connection is only used by one request at a time."""
+    def __init__(self, max_idle_connections: int=HTTP_MAX_IDLE_CONNECTIONS, retries: int=HTTP_RETRIES, retry_backoff: float=HTTP_RETRY_BACKOFF):
+        self.max_idle_connections = max_idle_connections # per host
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.ssl_context = ssl.create_default_context() # honours SSL_CERT_FILE, see run.py
+
+        self.lock = threading.Lock()
+        self.idle_connections = {} # (scheme, host, port) -> connections ready for another request
+        self.stats = {} # host -> HostStats
+        self.proxies = urllib.request.getproxies() # scheme -> proxy URL
+        self.proxy_routes = {} # (scheme, host) -> see get_proxy
+
+    def get_stats(self, host: str):
+        with self.lock:
+            return self.stats.setdefault(host, HostStats())
+
+    def count(self, stats: HostStats, **increments):
+        with self.lock: # requests on other threads count for the same host
+            for name, increment in increments.items():
+                setattr(stats, name, getattr(stats, name) + increment)
+
+    def get_proxy(self, scheme: str, host: str):
+        """(proxy host, proxy port, Proxy-Authorization value or None) to reach host through, None to connect directly."""
+        with self.lock:
+            if (scheme, host) in self.proxy_routes:
+                return self.proxy_routes[(scheme, host)]
+
+        proxy = None
+        proxy_url = self.proxies.get(scheme)
+
+        if proxy_url and not (urllib.request.proxy_bypass_environment(host, self.proxies) if "no" in self.proxies else urllib.request.proxy_bypass(host)): # NO_PROXY as read with the proxies
+            parts = urllib.parse.urlsplit(proxy_url if "://" in proxy_url else f"http://{proxy_url}")
+            authorization = None
+
+            if parts.username is not None:
+                credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+                authorization = f"Basic {base64.b64encode(credentials.encode()).decode()}"
+
+            proxy = (parts.hostname, parts.port or 80, authorization)
+
+        with self.lock:
+            self.proxy_routes[(scheme, host)] = proxy
+
+        return proxy
+
+    def get_connection(self, scheme: str, host: str, port: int | None, timeout: float, proxy: tuple | None=None):
+        with self.lock:
+            idle_connections = self.idle_connections.get((scheme, host, port))
+            connection = idle_connections.pop() if idle_connections else None
+
+        if connection is None:
+            if proxy is None:
+                connection_host, connection_port = host, port
+            else:
+                connection_host, connection_port = proxy[0], proxy[1]
+
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(connection_host, connection_port, timeout=timeout, context=self.ssl_context)
+                if proxy is not None: # TLS to host inside a CONNECT tunnel through the proxy
+                    connection.set_tunnel(host, port, headers={"Proxy-Authorization": proxy[2]} if proxy[2] else None)
+            else:
+                connection = http.client.HTTPConnection(connection_host, connection_port, timeout=timeout)
+            return connection, False
+
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+
+        return connection, True
+
+    def release_connection(self, scheme: str, host: str, port: int | None, connection: http.client.HTTPConnection):
+        with self.lock:
+            idle_connections = self.idle_connections.setdefault((scheme, host, port), [])
+            if len(idle_connections) < self.max_idle_connections:
+                idle_connections.append(connection)
+                return
+
+        connection.close()
+
+    def request(self, url: str, headers: dict | None=None, timeout: float=HTTP_TIMEOUT):
+        """Returns (status, response headers, decoded body) of a GET request, after redirects and retries."""
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self.request_once(url, headers, timeout)
+
+            if not status in REDIRECT_STATUSES or not response_headers.get("Location"):
+                return status, response_headers, body
+
+            url = urllib.parse.urljoin(url, response_headers["Location"])
+
+        raise urllib.error.HTTPError(url, status, "Too many redirects", response_headers, None)
+
+    def request_once(self, url: str, headers: dict | None, timeout: float):
+        parts = urllib.parse.urlsplit(url)
+        path = f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+        request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip", **(headers or {})}
+        stats = self.get_stats(parts.hostname)
+
+        proxy = self.get_proxy(parts.scheme, parts.hostname)
+        if proxy is not None and parts.scheme == "http": # plain HTTP proxies take the whole URL instead of a path
+            path = urllib.parse.urlunsplit(parts._replace(fragment=""))
+            if proxy[2]:
+                request_headers["Proxy-Authorization"] = proxy[2]
+
+        attempt = 0
+        while True:
+            connection, reused = self.get_connection(parts.scheme, parts.hostname, parts.port, timeout, proxy)
+            start_time = time.perf_counter()
+
+            try:
+                connection.request("GET", path, headers=request_headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+
+                if reused and isinstance(e, STALE_CONNECTION_ERRORS): # the server closed it while it was idle, that's no failure of the host
+                    logging.debug(f"Retrying {url} on a new connection after {e!r}")
+                    self.count(stats, retries=1)
+                    continue
+
+                self.count(stats, failures=1)
+                if attempt >= self.retries:
+                    raise urllib.error.URLError(e) from e # what urlopen raises for it
+
+                logging.debug(f"Retrying {url} after {e}")
+                self.count(stats, retries=1)
+                time.sleep(self.retry_backoff * 2 ** attempt)
+                attempt += 1
+                continue
+
+            self.count(stats, requests=1, total_latency=time.perf_counter() - start_time, reused_connections=int(reused), new_connections=int(not reused))
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.release_connection(parts.scheme, parts.hostname, parts.port, connection)
+
+            if response.status in RETRY_STATUSES and attempt < self.retries:
+                logging.debug(f"Retrying {url} after HTTP {response.status}")
+                self.count(stats, retries=1)
+                time.sleep(self.retry_backoff * 2 ** attempt)
+                attempt += 1
+                continue
+
+            encoding = response.getheader("Content-Encoding", "").lower()
+            try:
+                if encoding == "gzip":
+                    body = gzip.decompress(body)
+                elif encoding == "deflate":
+                    body = zlib.decompress(body)
+            except (OSError, EOFError, zlib.error) as e: # corrupt or truncated body
+                self.count(stats, failures=1)
+                raise urllib.error.URLError(f"Couldn't decode {encoding} body of {url}: {e}") from e
+
+            return response.status, response.headers, body
+
+    def get(self, url: str, headers: dict | None=None, timeout: float=HTTP_TIMEOUT):
+        """The body of a successful GET request. Raises urllib.error.HTTPError for error statuses, like urlopen."""
+        status, response_headers, body = self.request(url, headers, timeout)
+
+        if status >= 400:
+            self.count(self.get_stats(urllib.parse.urlsplit(url).hostname), failures=1)
+            raise urllib.error.HTTPError(url, status, http.client.responses.get(status, "Error"), response_headers, None)
+
+        return body
+
+    def format_stats(self):
+        with self.lock:
+            return "; ".join(f"{host}: {stats.format()}" for host, stats in self.stats.items())
+
+    def close(self):
+        with self.lock:
+            for idle_connections in self.idle_connections.values():
+                for connection in idle_connections:
+                    connection.close()
+            self.idle_connections.clear()
+
+http_client = None
+http_client_lock = threading.Lock()
+
+def get_http_client():
+    global http_client
+
+    with http_client_lock: # used from prefetch and download threads
+        if http_client is None:
+            http_client = HTTPClient()
+
+    return http_client
@@ -0,0 +1,88 @@
+import io, os
+
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3, ParseID3v1
+from mutagen.mp3 import MPEGInfo, HeaderNotFoundError
+
+ID3V2_HEADER_SIZE = 10
+ID3V1_SIZE = 128
+
+def get_syncsafe_int(data: bytes):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+class TrackTags():
+    """A single parse of a file's ID3 tag, plus the MPEG stream info found right after it."""
+    def __init__(self, file_path: str, id3: ID3, info: MPEGInfo | None):
+        self.file_path = file_path
+        self.id3 = id3
+        self.info = info
+
+    def get_easy(self, key: str, default=None):
+        # EasyID3's key registry works on any ID3 instance, so we don't need a second EasyID3 parse.
+        try:
+            values = EasyID3.Get[key](self.id3, key)
+        except KeyError:
+            return default
+
+        return values[0] if values else default
+
+    def set_easy(self, key: str, value: str | list[str]):
+        EasyID3.Set[key](self.id3, key, [value] if isinstance(value, str) else value)
+
+    def get_easy_dict(self):
+        easy_dict = {}
+
+        for key, getter in EasyID3.Get.items():
+            if "*" in key:
+                continue
+
+            try:
+                values = getter(self.id3, key)
+            except KeyError:
+                continue
+
+            if values:
+                easy_dict[key] = values[0]
+
+        return easy_dict
+
+    def get_cover_frame(self):
+        apic = self.id3.getall("APIC")
+        return apic[0] if apic else None
+
+    def save(self):
+        self.id3.save(self.file_path)
+
+def read_tags(file_path: str, with_info: bool=True):
+    """Reads only the ID3v2 region (and the ID3v1 trailer), then the first MPEG frame headers. Audio data is never read."""
+    id3 = ID3()
+    info = None
+
+    with open(file_path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+
+        header = file.read(ID3V2_HEADER_SIZE)
+        tag_end = 0
+
+        if len(header) == ID3V2_HEADER_SIZE and header[:3] == b"ID3":
+            tag_end = ID3V2_HEADER_SIZE + get_syncsafe_int(header[6:10])
+            if header[5] & 0x10: # footer present
+                tag_end += ID3V2_HEADER_SIZE
+
+            id3.load(io.BytesIO(header + file.read(tag_end - ID3V2_HEADER_SIZE)), load_v1=False)
+
+        if file_size - tag_end >= ID3V1_SIZE:
+            file.seek(-ID3V1_SIZE, os.SEEK_END)
+            v1_frames = ParseID3v1(file.read(ID3V1_SIZE))
+
+            for frame in (v1_frames or {}).values():
+                if not id3.getall(frame.FrameID):
+                    id3.add(frame)
+
+        if with_info:
+            try:
+                info = MPEGInfo(file, tag_end)
+            except HeaderNotFoundError:
+                pass
+
+    return TrackTags(file_path, id3, info)
@@ -0,0 +1,232 @@
+import os, json, copy, time, collections
+
+from utils.constants import DIRECTORY_TIMEOUT
+from utils.music_handling import to_file_metadata
+from utils.library_index import get_library_index
+from utils.library_scan import get_tab_scanner, get_default_worker_count, stat_files, FOREGROUND, BACKGROUND
+from utils.directory_walker import walk_audio_files
+from utils.track_identity import get_track_identities
+from utils.file_watching import watch_directories, watch_files
+
+class Library():
+    """Tabs, playlists and the metadata of their tracks for the whole session.
+    Main views come and go, the library keeps its content, scans and file watchers and only reloads the parts whose settings changed."""
+    def __init__(self):
+        self.library_index = get_library_index()
+        self.track_identities = get_track_identities() # file_metadata is keyed by track id, tab and playlist content holds paths
+        self.tab_scanner = None
+        self.file_metadata = {}
+        self.thumb_resolution = None
+
+        self.settings_dict = {}
+        self.tab_options = [] # the existing ones of settings_dict["tab_options"]
+        self.tab_content = {} # tab -> paths relative to the tab
+        self.listing_requests = {} # tab -> id of the scan request still listing it
+        self.playlist_content = {}
+        self.file_changes = collections.deque()
+
+        self.tab_observer = None
+        self.playlist_observer = None
+        self.tab_settings = None # what the tabs were loaded with, see sync
+        self.playlist_settings = None
+
+    def sync(self, settings_dict: dict, thumb_resolution: tuple, current_tab: str | None, current_mode: str):
+        """Adopts a freshly read settings_dict. Tabs and playlists are only listed and watched again if the settings they depend on changed."""
+        self.settings_dict = settings_dict
+        self.thumb_resolution = thumb_resolution
+
+        tab_scanner = get_tab_scanner(thumb_resolution, self.library_index, settings_dict.get("scan_workers", get_default_worker_count()))
+        if tab_scanner is not self.tab_scanner: # new resolution or worker count, nothing is scanned yet
+            self.tab_scanner = tab_scanner
+            self.file_metadata = tab_scanner.file_metadata
+            self.tab_settings = self.playlist_settings = None
+
+        watcher_window = settings_dict.get("watcher_window", 1000)
+        tab_options = settings_dict.get("tab_options", [os.path.join("~", "Music"), os.path.join("~", "Downloads")])
+        playlists = settings_dict.get("playlists", {})
+
+        tab_settings = (list(tab_options), settings_dict.get("follow_symlinks", False), settings_dict.get("directory_timeout", DIRECTORY_TIMEOUT), watcher_window)
+        if tab_settings != self.tab_settings:
+            self.tab_options[:] = [tab for tab in tab_options if os.path.isdir(os.path.expanduser(tab))]
+            self.load_tabs(current_tab if current_mode == "files" else None)
+            self.tab_settings = tab_settings
+
+        playlist_settings = (copy.deepcopy(playlists), watcher_window)
+        self.load_playlists(current_tab if current_mode == "playlist" else None, playlist_settings != self.playlist_settings)
+        self.playlist_settings = playlist_settings
+
+    def load_tabs(self, current_tab: str | None):
+        self.tab_content.clear()
+        self.listing_requests.clear()
+
+        # Only the shown tab is listed and scanned right away, the others follow in the background
+        if current_tab:
+            self.request_scan(os.path.expanduser(current_tab), "files", FOREGROUND)
+
+        for tab in self.tab_options:
+            if not (current_tab and os.path.expanduser(tab) == os.path.expanduser(current_tab)):
+                self.request_scan(os.path.expanduser(tab), "files")
+
+        if self.tab_observer:
+            self.tab_observer.stop()
+        self.tab_observer = watch_directories([os.path.expanduser(tab) for tab in self.tab_options], self.on_file_change, self.settings_dict.get("watcher_window", 1000) / 1000, recursive=True)
+
+    def load_playlists(self, current_playlist: str | None, changed: bool):
+        # the content lists belong to settings_dict, which every Main reads again, so they are picked up again in show_content
+        self.playlist_content.clear()
+        playlists = self.settings_dict.get("playlists", {})
+
+        if current_playlist in playlists:
+            self.request_scan(current_playlist, "playlist", FOREGROUND)
+
+        if not changed:
+            return
+
+        for playlist in playlists:
+            if playlist != current_playlist:
+                self.request_scan(playlist, "playlist")
+
+        if self.playlist_observer:
+            self.playlist_observer.stop()
+        self.playlist_observer = watch_files([file for content in playlists.values() for file in content], self.on_file_change, self.settings_dict.get("watcher_window", 1000) / 1000)
+
+    def request_scan(self, tab: str, content_type: str, priority: int=BACKGROUND):
+        if content_type == "files":
+            files = walk_audio_files(tab, self.settings_dict.get("follow_symlinks", False), self.settings_dict.get("directory_timeout", DIRECTORY_TIMEOUT))
+
+            if priority == FOREGROUND: # the walk streams the tab content in, see apply_listings
+                self.tab_content[tab] = []
+                self.listing_requests[tab] = self.tab_scanner.request(files, FOREGROUND, tab)
+            else:
+                self.tab_scanner.request(files)
+
+        elif priority == FOREGROUND:
+            content = self.settings_dict["playlists"][tab]
+            content[:] = [file for file in content if os.path.isfile(file)] # also removes references from self.settings_dict["playlists"]
+            self.playlist_content[tab] = content
+
+            self.tab_scanner.request(stat_files(list(content)), FOREGROUND)
+        else:
+            self.tab_scanner.request(stat_files(list(self.settings_dict["playlists"][tab])))
+
+    def remove_from_playlist(self, playlist: str, music_path: str):
+        self.settings_dict["playlists"][playlist].remove(music_path) # playlist_content holds the same list
+
+        with open("settings.json", "w") as file:
+            file.write(json.dumps(self.settings_dict, indent=4))
+
+        self.playlist_settings = (copy.deepcopy(self.settings_dict["playlists"]), self.playlist_settings[1]) # nothing to reload for it
+
+    def apply_listings(self):
+        """Adds newly listed files to tab_content. Returns (tab, paths, done) for every listing of a current request."""
+        listings = []
+
+        while self.tab_scanner.listings:
+            request_id, tab, file_paths, done = self.tab_scanner.listings.popleft()
+
+            if self.listing_requests.get(tab) != request_id: # from an older listing
+                continue
+
+            self.tab_content[tab].extend(os.path.relpath(file_path, tab) for file_path in file_paths)
+
+            if done:
+                del self.listing_requests[tab]
+
+            listings.append((tab, file_paths, done))
+
+        return listings
+
+    def apply_scan_results(self, time_budget: float):
+        """Moves scan results into file_metadata for up to time_budget seconds. Returns the updated track ids."""
+        start_time = time.perf_counter()
+        updated_ids = set()
+
+        while self.tab_scanner.results and time.perf_counter() - start_time < time_budget:
+            batch = self.tab_scanner.results.popleft()
+
+            for n, (track_id, metadata) in enumerate(batch):
+                if time.perf_counter() - start_time >= time_budget:
+                    self.tab_scanner.results.appendleft(batch[n:]) # continue next frame
+                    break
+
+                self.file_metadata[track_id] = to_file_metadata(metadata)
+                updated_ids.add(track_id)
+
+        return updated_ids
+
+    def get_file_metadata(self, music_path: str):
+        track_id = self.track_identities.get_id(music_path)
+
+        if not track_id in self.file_metadata: # not reached by the background scan yet
+            self.file_metadata[track_id] = to_file_metadata(self.library_index.load_metadata(self.track_identities.get_path(track_id), self.thumb_resolution))
+
+        return self.file_metadata[track_id]
+
+    def get_metadata(self, music_path: str):
+        """Like get_file_metadata, but None instead of scanning if the file wasn't scanned yet or is gone."""
+        return self.file_metadata.get(self.track_identities.find_id(music_path))
+
+    def on_file_change(self, changes):
+        self.file_changes.append(changes) # applied by Main in on_update, because the observer runs in another thread and OpenGL is single-threaded.
+
+    def apply_file_changes(self, changes):
+        """Applies a batch of watcher events. Returns (removed paths, (tab, added path) pairs, updated track ids) for the view."""
+        removed, added, updated_ids = [], [], set()
+
+        for event_type, path in changes:
+            self.apply_file_change(event_type, path, removed, added, updated_ids)
+
+        self.library_index.commit()
+
+        return removed, added, updated_ids
+
+    def apply_file_change(self, event_type: str, path: str, removed: list, added: list, updated_ids: set):
+        tabs = [tab for tab in self.tab_content if os.path.normpath(path).startswith(os.path.join(os.path.normpath(tab), ""))]
+        playlists = [playlist for playlist, content in self.playlist_content.items() if path in content]
+
+        if event_type == "delete":
+            for tab in tabs:
+                if os.path.relpath(path, tab) in self.tab_content[tab]:
+                    self.tab_content[tab].remove(os.path.relpath(path, tab))
+            for playlist in playlists:
+                self.playlist_content[playlist].remove(path) # also removes reference from self.settings_dict["playlists"], like request_scan does
+
+            removed.extend([os.path.join(tab, os.path.relpath(path, tab)) for tab in tabs] + ([path] if playlists else []))
+
+            track_id = self.track_identities.ids.get(path)
+            if track_id is not None:
+                real_path = self.track_identities.get_path(track_id)
+                self.track_identities.forget(path)
+
+                if not track_id in self.track_identities.paths: # no other path leads to it
+                    self.tab_scanner.forget(track_id)
+                    self.library_index.remove(real_path)
+
+        elif event_type in ["create", "modify"]:
+            if not (tabs or playlists) or not os.path.isfile(path):
+                return
+
+            self.track_identities.forget(path) # might be a different file now
+            track_id = self.track_identities.get_id(path)
+            self.tab_scanner.forget(track_id)
+            self.get_file_metadata(path)
+
+            for tab in tabs:
+                relative_path = os.path.relpath(path, tab)
+                if relative_path in self.tab_content[tab] or tab in self.listing_requests: # a running listing still finds it
+                    continue
+
+                self.tab_content[tab].append(relative_path)
+                added.append((tab, os.path.join(tab, relative_path)))
+
+            updated_ids.add(track_id)
+
+library = None
+
+def get_library():
+    global library
+
+    if library is None:
+        library = Library()
+
+    return library
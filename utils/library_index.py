@@ -0,0 +1,164 @@
+import sqlite3, threading, json, os, sys
+
+from utils.constants import LIBRARY_INDEX_PATH
+from utils.music_handling import read_metadata
+from utils.thumbnail_pack import get_thumbnail_pack
+
+class LibraryIndex():
+    """Persistent per-file metadata store, keyed by path and validated with size and mtime."""
+    def __init__(self, path: str=LIBRARY_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS tracks (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            thumb_width INTEGER NOT NULL,
+            thumb_height INTEGER NOT NULL,
+            metadata TEXT NOT NULL
+        )""") # thumbnails live in the thumbnail pack, see put
+        self.connection.commit()
+
+    def get(self, file_path: str, stat: os.stat_result, thumb_resolution: tuple):
+        with self.lock:
+            row = self.connection.execute("SELECT size, mtime_ns, thumb_width, thumb_height, metadata FROM tracks WHERE path = ?", (file_path,)).fetchone()
+
+        if row is None or (row[0], row[1]) != (stat.st_size, stat.st_mtime_ns) or (row[2], row[3]) != tuple(thumb_resolution):
+            self.misses += 1
+            return None
+
+        metadata = json.loads(row[4])
+
+        # rows from before the thumbnail pack have no cover_hash, evicted thumbnails have to be decoded again
+        if not "cover_hash" in metadata or (metadata["cover_hash"] and not get_thumbnail_pack().contains(metadata["cover_hash"], thumb_resolution)):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        metadata["thumbnail_data"] = None
+        return metadata
+
+    def put(self, file_path: str, stat: os.stat_result, thumb_resolution: tuple, metadata: dict):
+        serializable_metadata = {key: value for key, value in metadata.items() if key != "thumbnail_data"}
+
+        if metadata["thumbnail_data"]:
+            get_thumbnail_pack().put(metadata["cover_hash"], thumb_resolution, metadata["thumbnail_data"])
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tracks (path, size, mtime_ns, thumb_width, thumb_height, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns, thumb_resolution[0], thumb_resolution[1], json.dumps(serializable_metadata))
+            )
+
+    def remove(self, file_path: str):
+        with self.lock:
+            self.connection.execute("DELETE FROM tracks WHERE path = ?", (file_path,))
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def load_metadata(self, file_path: str, thumb_resolution: tuple):
+        stat = os.stat(file_path)
+
+        metadata = self.get(file_path, stat, thumb_resolution)
+        if metadata is None:
+            metadata = read_metadata(file_path, thumb_resolution, get_thumbnail_pack().get_cover_hashes(thumb_resolution))
+            self.put(file_path, stat, thumb_resolution, metadata)
+
+        return metadata
+
+    def get_cover_hashes(self, thumb_resolution: tuple):
+        """Cover hash of every indexed track with a cover at thumb_resolution, a cover shared by several tracks is in it several times."""
+        with self.lock:
+            rows = self.connection.execute("SELECT metadata FROM tracks WHERE thumb_width = ? AND thumb_height = ?", tuple(thumb_resolution)).fetchall()
+
+        return [cover_hash for cover_hash in (json.loads(row[0]).get("cover_hash") for row in rows) if cover_hash]
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self):
+        """Drops entries whose file is gone or changed on disk. Returns (valid, stale, missing) counts."""
+        valid, stale, missing = 0, [], []
+
+        with self.lock:
+            rows = self.connection.execute("SELECT path, size, mtime_ns FROM tracks").fetchall()
+
+        for file_path, size, mtime_ns in rows:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                missing.append(file_path)
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                stale.append(file_path)
+            else:
+                valid += 1
+
+        with self.lock:
+            self.connection.executemany("DELETE FROM tracks WHERE path = ?", [(file_path,) for file_path in stale + missing])
+            self.connection.commit()
+
+        return valid, len(stale), len(missing)
+
+    def rebuild(self, thumb_resolution: tuple):
+        """Re-reads every indexed file that still exists. Returns the amount of files re-indexed."""
+        with self.lock:
+            paths = [row[0] for row in self.connection.execute("SELECT path FROM tracks").fetchall()]
+            self.connection.execute("DELETE FROM tracks")
+            self.connection.commit()
+
+        rebuilt = 0
+        known_cover_hashes = get_thumbnail_pack().get_cover_hashes(thumb_resolution) # grows as covers are decoded, so each is decoded once
+
+        for file_path in paths:
+            if not os.path.isfile(file_path):
+                continue
+
+            self.put(file_path, os.stat(file_path), thumb_resolution, read_metadata(file_path, thumb_resolution, known_cover_hashes))
+            rebuilt += 1
+
+        self.commit()
+        return rebuilt
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+library_index = None
+
+def get_library_index():
+    global library_index
+
+    if library_index is None:
+        library_index = LibraryIndex()
+
+    return library_index
+
+def get_thumb_resolution_from_settings():
+    with open("settings.json", "r", encoding="utf-8") as file:
+        width, height = map(int, json.load(file)["resolution"].split("x"))
+
+    return (int(width / 16), int(height / 9))
+
+if __name__ == "__main__": # python -m utils.library_index verify|rebuild
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    index = get_library_index()
+
+    if command == "verify":
+        valid, stale, missing = index.verify()
+        print(f"{valid} valid, {stale} stale and {missing} missing entries. Stale and missing entries were removed.")
+    elif command == "rebuild":
+        print(f"Rebuilt {index.rebuild(get_thumb_resolution_from_settings())} entries.")
+    else:
+        print("Usage: python -m utils.library_index [verify|rebuild]")
+
+    index.close()
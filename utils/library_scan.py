@@ -0,0 +1,276 @@
+import os, sys, logging, threading, collections, itertools, queue
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Iterable, Iterator
+
+from utils.music_handling import read_metadata
+from utils.thumbnail_pack import get_thumbnail_pack
+from utils.track_identity import get_track_identities
+
+FOREGROUND = 0
+BACKGROUND = 1
+LISTING_CHUNK_SIZE = 256
+
+def get_default_worker_count():
+    return os.cpu_count() or 4
+
+def create_scan_executor(workers: int):
+    # The standalone build excludes multiprocessing, so it scans with threads.
+    # Workers come from a fork server or are spawned, forking this process would copy the locks its other threads hold.
+    if not getattr(sys, "frozen", False) and not "__compiled__" in globals():
+        try:
+            import multiprocessing # not in the standalone build, so only imported here
+
+            from concurrent.futures import ProcessPoolExecutor
+
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["__main__", __name__]) # imported once by the server instead of by every worker
+            else:
+                context = multiprocessing.get_context("spawn")
+
+            return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        except (ImportError, ValueError, OSError, NotImplementedError) as e:
+            logging.debug(f"Couldn't start scan process pool, falling back to threads: {e}")
+
+    return ThreadPoolExecutor(max_workers=workers)
+
+def stat_files(file_paths: Iterable[str]):
+    for file_path in file_paths:
+        try:
+            yield file_path, os.stat(file_path)
+        except OSError:
+            continue
+
+def read_metadata_safely(file_path: str, thumb_resolution: tuple, known_cover_hashes: set | frozenset):
+    """read_metadata for the scan workers. A file that can't be read gives None instead of ending the whole map."""
+    try:
+        return read_metadata(file_path, thumb_resolution, known_cover_hashes)
+    except Exception as e:
+        logging.warning(f"Couldn't scan {file_path}: {e}")
+        return None
+
+def scan_files_in_batches(files: list[tuple[str, os.stat_result]], thumb_resolution: tuple, library_index, executor=None, workers: int=1, batch_size: int=64):
+    """Yields lists of (path, metadata) as plain data for (path, stat) pairs. Index hits come first, misses follow as the executor parses them."""
+    batch = []
+    misses = []
+
+    for file_path, stat in files:
+        metadata = library_index.get(file_path, stat, thumb_resolution)
+        if metadata is None:
+            misses.append((file_path, stat))
+            continue
+
+        batch.append((file_path, metadata))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+        batch = []
+
+    if not misses:
+        return
+
+    miss_paths = [file_path for file_path, _ in misses]
+
+    # the workers get the pack's covers with their arguments instead of opening the pack themselves.
+    # A process pool unpickles one copy per chunk, so covers decoded earlier in a chunk aren't decoded again, results come back in order.
+    # Threads would share one set and could skip a cover another thread hasn't handed back yet, so they only get a frozen copy.
+    known_cover_hashes = get_thumbnail_pack().get_cover_hashes(thumb_resolution)
+    if isinstance(executor, ThreadPoolExecutor) and len(misses) > 1:
+        known_cover_hashes = frozenset(known_cover_hashes)
+
+    if executor is None or len(misses) == 1:
+        scanned = map(read_metadata_safely, miss_paths, repeat(thumb_resolution), repeat(known_cover_hashes))
+    else:
+        scanned = executor.map(read_metadata_safely, miss_paths, repeat(thumb_resolution), repeat(known_cover_hashes), chunksize=max(1, min(batch_size, len(misses) // (workers * 4))))
+
+    try:
+        for (file_path, stat), metadata in zip(misses, scanned):
+            if metadata is None: # not indexed, so it's tried again on the next scan
+                continue
+
+            library_index.put(file_path, stat, thumb_resolution, metadata)
+
+            batch.append((file_path, metadata))
+            if len(batch) >= batch_size:
+                library_index.commit()
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+    finally: # also reached when the consumer stops early
+        library_index.commit()
+        if hasattr(scanned, "close"):
+            scanned.close() # cancels the futures that didn't start yet
+
+class ScanRequest():
+    def __init__(self, request_id: int, priority: int, files: Iterator[tuple[str, os.stat_result]], tab: str | None):
+        self.request_id = request_id
+        self.priority = priority
+        self.files = files
+        self.tab = tab
+        self.pending = {} # canonical path -> (track id, stat), listed but not handed out yet
+
+        # the newest foreground request goes first, background requests keep their order
+        self.sort_key = (priority, -request_id if priority == FOREGROUND else request_id)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+class TabScanner():
+    """Scans tabs on a background thread, the shown tab first and every other tab at low priority afterwards.
+    Scanned files stay warm in file_metadata and are only scanned again once they changed on disk."""
+    def __init__(self, thumb_resolution: tuple, library_index, workers: int | None=None):
+        self.thumb_resolution = thumb_resolution
+        self.library_index = library_index
+        self.workers = workers or get_default_worker_count()
+        self.executor = None
+
+        self.track_identities = get_track_identities()
+        self.file_metadata = {} # track id -> metadata with textures, filled by the view on the main thread
+        self.scanned_stats = {} # track id -> (size, mtime_ns) of the results handed out
+        self.results = collections.deque() # batches of (track id, metadata) as plain data
+        self.listings = collections.deque() # (request id, tab, paths, done) for requests with a tab
+
+        self.requests = queue.PriorityQueue()
+        self.request_count = itertools.count()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.stopped = False
+        self.scanning = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, files: Iterable[tuple[str, os.stat_result]], priority: int=BACKGROUND, tab: str | None=None):
+        """Queues (path, stat) pairs for scanning. With a tab, the paths are also reported to listings as they are found. Returns the request id."""
+        scan_request = ScanRequest(next(self.request_count), priority, iter(files), tab)
+        self.requests.put(scan_request)
+        return scan_request.request_id
+
+    def forget(self, track_id: tuple):
+        self.file_metadata.pop(track_id, None)
+        self.scanned_stats.pop(track_id, None)
+
+    def should_yield(self, scan_request: ScanRequest):
+        with self.requests.mutex:
+            return bool(self.requests.queue) and self.requests.queue[0] < scan_request
+
+    def pause(self):
+        self.resumed.clear()
+
+    def resume(self):
+        self.resumed.set()
+
+    def stop(self):
+        self.stopped = True
+        self.requests.put(ScanRequest(-1, FOREGROUND - 1, iter(()), None))
+        self.resumed.set()
+
+    def get_executor(self):
+        if self.executor is None and self.workers > 1:
+            self.executor = create_scan_executor(self.workers)
+
+        return self.executor
+
+    def shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def run(self):
+        while True:
+            if self.requests.empty(): # idle, don't keep the workers around
+                self.shutdown_executor()
+
+            scan_request = self.requests.get()
+            self.resumed.wait()
+
+            if self.stopped:
+                self.shutdown_executor()
+                return
+
+            self.scanning = True
+
+            try:
+                if self.process(scan_request):
+                    logging.debug(f"Library index: {self.library_index.hits} hits, {self.library_index.misses} misses")
+                    self.library_index.reset_counters()
+                else:
+                    self.requests.put(scan_request) # continued later, where it stopped
+            except Exception: # the scanner thread has to survive for the rest of the session
+                logging.exception(f"Scan request {scan_request.request_id} failed")
+                self.shutdown_executor() # a broken pool would fail the next request too
+
+                if scan_request.tab is not None: # the view waits for the end of the listing
+                    self.listings.append((scan_request.request_id, scan_request.tab, [], True))
+
+            self.scanning = not self.requests.empty()
+
+    def process(self, scan_request: ScanRequest):
+        """Lists and scans a request chunk by chunk. Returns False if it has to make way for a more important request."""
+        while True:
+            if not scan_request.pending:
+                files = list(itertools.islice(scan_request.files, LISTING_CHUNK_SIZE))
+
+                if scan_request.tab is not None:
+                    self.listings.append((scan_request.request_id, scan_request.tab, [file_path for file_path, _ in files], not files))
+
+                if not files:
+                    return True
+
+                for file_path, stat in files:
+                    track_id = self.track_identities.get_id(file_path, stat)
+
+                    if self.scanned_stats.get(track_id) == (stat.st_size, stat.st_mtime_ns): # warm, or the same file through another path
+                        continue
+
+                    scan_request.pending[self.track_identities.get_path(track_id)] = (track_id, stat)
+
+                if not scan_request.pending:
+                    continue
+
+            # background tabs get a single worker and small batches, so a newly shown tab doesn't wait long for them
+            if scan_request.priority == FOREGROUND:
+                batches = scan_files_in_batches([(file_path, stat) for file_path, (_, stat) in scan_request.pending.items()], self.thumb_resolution, self.library_index, self.get_executor(), self.workers)
+            else:
+                batches = scan_files_in_batches([(file_path, stat) for file_path, (_, stat) in scan_request.pending.items()], self.thumb_resolution, self.library_index, batch_size=16)
+
+            for batch in batches:
+                self.resumed.wait()
+
+                if self.stopped:
+                    batches.close()
+                    return True
+
+                track_batch = []
+                for file_path, metadata in batch:
+                    track_id, stat = scan_request.pending.pop(file_path)
+                    self.scanned_stats[track_id] = (stat.st_size, stat.st_mtime_ns)
+                    track_batch.append((track_id, metadata))
+
+                self.results.append(track_batch)
+
+                if self.should_yield(scan_request):
+                    batches.close()
+                    return False
+
+            scan_request.pending.clear() # what is left couldn't be scanned
+
+tab_scanner = None
+
+def get_tab_scanner(thumb_resolution: tuple, library_index, workers: int | None=None):
+    global tab_scanner
+
+    if tab_scanner is None or tab_scanner.thumb_resolution != thumb_resolution or tab_scanner.workers != (workers or get_default_worker_count()):
+        if tab_scanner is not None:
+            tab_scanner.stop()
+
+        tab_scanner = TabScanner(thumb_resolution, library_index, workers)
+
+    return tab_scanner
@@ -1,60 +1,167 @@
-import urllib.parse, urllib.request, json
+import urllib.parse, json, bisect, time, logging
 
-from utils.utils import ensure_metadata_file
-from utils.constants import LRCLIB_BASE_URL
-
-def convert_syncronized_time_to_seconds(synchronized_time):
-    minutes_str, seconds_str = synchronized_time.split(":")
-    return float(minutes_str) * 60 + float(seconds_str)
+from utils.metadata_store import get_metadata_store, get_lyrics_key
+from utils.http_client import get_http_client
+from utils.id3_reader import TrackTags
+from utils.compiled_lyrics import CompiledLyrics, compile_lyrics
+from utils.constants import LRCLIB_BASE_URL, LRCLIB_TIMEOUT, LRCLIB_BACKOFF_BASE, LRCLIB_BACKOFF_MAX, LYRICS_NOT_FOUND_TTL
 
 def parse_synchronized_lyrics(synchronized_lyrics: str):
-    lyrics_list = {}
-    
-    for lyrics_line in synchronized_lyrics.splitlines():
-        uncleaned_date, text = lyrics_line.split("] ")
-        cleaned_date = uncleaned_date.replace("[", "")
-
-        lyrics_list[convert_syncronized_time_to_seconds(cleaned_date)] = text
+    """Sorted line times in seconds and a dict of time -> text, for writing SYLT frames. Playback uses compiled lyrics instead."""
+    compiled_lyrics = compile_lyrics(synchronized_lyrics)
+    lyrics_list = {compiled_lyrics.offsets[n] / 1000: compiled_lyrics.get_line(n) for n in range(len(compiled_lyrics))}
 
     return list(lyrics_list.keys()), lyrics_list
 
-def get_closest_time(current_time, lyrics_times):
-    closest_time = 0
+class LyricsCursor():
+    """Follows the active line of compiled lyrics. Playback mostly moves on by one line, so that is checked first, seeks fall back to a binary search."""
+    def __init__(self, compiled_lyrics: CompiledLyrics):
+        self.lyrics = compiled_lyrics
+        self.offsets = compiled_lyrics.offsets
+        self.index = None # active line, -1 before the first one, None until the first update
+
+    def find_index(self, current_offset: int):
+        index, offsets = self.index, self.offsets
+
+        if index is not None:
+            if (index < 0 or offsets[index] <= current_offset) and (index + 1 == len(offsets) or current_offset < offsets[index + 1]):
+                return index
+            if index + 1 < len(offsets) and offsets[index + 1] <= current_offset and (index + 2 == len(offsets) or current_offset < offsets[index + 2]):
+                return index + 1
+
+        return bisect.bisect_right(offsets, current_offset) - 1
+
+    def update(self, current_time: float):
+        """Moves to the line active at current_time, in seconds. Returns whether it changed, so the labels only have to be laid out again then."""
+        index = self.find_index(int(current_time * 1000))
+        if index == self.index:
+            return False
+
+        self.index = index
+        return True
+
+    def get_current_line(self):
+        return (self.lyrics.get_line(self.index) if self.index >= 0 else None) or "[Music]"
+
+    def get_next_lines(self, count: int=10):
+        return "\n".join(self.lyrics.get_line(n) for n in range(self.index + 1, min(self.index + 1 + count, len(self.offsets))))
+
+def get_embedded_lyrics(tags: TrackTags):
+    """(plain, synchronized) lyrics from a file's USLT and SYLT frames. SYLT frames in milliseconds are turned back into LRC text, like add_metadata_to_file wrote it."""
+    uslt_frames = tags.id3.getall("USLT")
+    plain_lyrics = str(uslt_frames[0].text) if uslt_frames and uslt_frames[0].text else None
+
+    for sylt_frame in tags.id3.getall("SYLT"):
+        if sylt_frame.format != 2 or not sylt_frame.text: # format 1 counts MPEG frames, not milliseconds
+            continue
+
+        synchronized_lyrics = "\n".join(f"[{milliseconds // 60000:02}:{milliseconds % 60000 / 1000:05.2f}] {text.strip()}" for text, milliseconds in sylt_frame.text)
+        return plain_lyrics or "\n".join(text.strip() for text, _ in sylt_frame.text), synchronized_lyrics
+
+    return plain_lyrics, None
+
+def get_cached_lyrics(artist, title):
+    """Lyrics get_lyrics fetched before, also the ones it found by title only. None if there are none."""
+    metadata_store = get_metadata_store()
+
+    for query_artist in ([artist, None] if artist else [None]):
+        lyrics = metadata_store.get("lyrics", get_lyrics_key(query_artist, title))
+        if lyrics is not None:
+            return lyrics
+
+    return None
+
+class Backoff():
+    """Exponential backoff for a host that failed, so a dead connection costs one timeout instead of one per lookup."""
+    def __init__(self, base_delay: float, max_delay: float):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.retry_time = 0
+
+    def is_ready(self):
+        return time.monotonic() >= self.retry_time
 
-    for lyrics_time in lyrics_times:
-        if lyrics_time <= current_time and lyrics_time > closest_time:
-            closest_time = lyrics_time
+    def fail(self):
+        self.failures += 1
+        self.retry_time = time.monotonic() + min(self.base_delay * 2 ** (self.failures - 1), self.max_delay)
 
-    return closest_time
+    def succeed(self):
+        self.failures = 0
+        self.retry_time = 0
+
+lrclib_backoff = Backoff(LRCLIB_BACKOFF_BASE, LRCLIB_BACKOFF_MAX)
+
+def resolve_lyrics(artist, title, tags: TrackTags | None=None):
+    """Looks for lyrics in the file's own frames, then in the lyrics cache, then on lrclib.
+    Returns (plain, synchronized, tier, seconds), tier being "embedded", "cache", "network", "failed" if lrclib couldn't be asked or None if nothing was found."""
+    start_time = time.perf_counter()
+    plain_lyrics, synchronized_lyrics, tier = None, None, None
+
+    if tags is not None:
+        plain_lyrics, synchronized_lyrics = get_embedded_lyrics(tags)
+        if synchronized_lyrics:
+            tier = "embedded"
+
+    if tier is None:
+        cached_lyrics = get_cached_lyrics(artist, title)
+        if cached_lyrics and cached_lyrics[1]:
+            (plain_lyrics, synchronized_lyrics), tier = cached_lyrics, "cache"
+
+    if tier is None:
+        try:
+            fetched_lyrics = get_lyrics(artist, title)
+        except (OSError, ValueError) as e: # no connection, or lrclib answered with something else than JSON
+            logging.debug(f"Couldn't fetch lyrics for {artist} - {title}: {e}")
+            fetched_lyrics, tier = [None, None], "failed"
+
+        if fetched_lyrics[1]:
+            (plain_lyrics, synchronized_lyrics), tier = fetched_lyrics, "network"
+        elif not lrclib_backoff.is_ready(): # skipped while backing off, a successful lookup resets the backoff
+            tier = "failed"
+
+    elapsed_time = time.perf_counter() - start_time
+    logging.debug(f"Lyrics for {artist} - {title}: {tier or 'none found'} after {elapsed_time * 1000:.2f} ms")
+
+    return plain_lyrics, synchronized_lyrics, tier, elapsed_time
 
 def get_lyrics(artist, title):
-    metadata_cache = ensure_metadata_file()
-
-    if artist in metadata_cache["lyrics_by_artist_title"] and title in metadata_cache["lyrics_by_artist_title"][artist]:
-        return metadata_cache["lyrics_by_artist_title"][artist][title]
-    else:
-        if artist:
-            query = f"{artist} - {title}"
-        else:
-            query = title
-    
-        query_string = urllib.parse.urlencode({"q": query})
+    """(plain, synchronized) lyrics from the cache or lrclib, [None, None] if lrclib has none or is being backed off from.
+    Lookups without a result are remembered for LYRICS_NOT_FOUND_TTL, so tracks without lyrics, like instrumentals, are only looked up once."""
+    metadata_store = get_metadata_store()
+
+    # if there was an artist, it might have been misleading. For example, on Youtube, the uploader might not be the artist. We retry with only title.
+    for query_artist in ([artist, None] if artist else [None]):
+        lyrics_key = get_lyrics_key(query_artist, title)
+
+        lyrics = metadata_store.get("lyrics", lyrics_key)
+        if lyrics is not None:
+            return lyrics
+
+        if metadata_store.get("lyrics_not_found", lyrics_key, 0) > time.time():
+            continue
+
+        if not lrclib_backoff.is_ready():
+            logging.debug(f"Not asking lrclib for {title}, backing off after {lrclib_backoff.failures} failures")
+            return [None, None]
+
+        query_string = urllib.parse.urlencode({"q": f"{query_artist} - {title}" if query_artist else title})
         full_url = f"{LRCLIB_BASE_URL}?{query_string}"
 
-        with urllib.request.urlopen(full_url) as request:
-            data = json.loads(request.read().decode("utf-8"))
-    
-        for result in data:
-            if result.get("plainLyrics") and result.get("syncedLyrics"):
-                if not artist in metadata_cache["lyrics_by_artist_title"]:
-                    metadata_cache["lyrics_by_artist_title"][artist] = {}
-
-                metadata_cache["lyrics_by_artist_title"][artist][title] = (result["plainLyrics"], result["syncedLyrics"])
-                with open("metadata_cache.json", "w") as file:
-                    file.write(json.dumps(metadata_cache))
-                return (result["plainLyrics"], result["syncedLyrics"])
-
-    if artist: # if there was an artist, it might have been misleading. For example, on Youtube, the uploader might not be the artist. We retry with only title.
-        return get_lyrics(None, title)
-    
+        try:
+            data = json.loads(get_http_client().get(full_url, timeout=LRCLIB_TIMEOUT).decode("utf-8"))
+        except (OSError, ValueError):
+            lrclib_backoff.fail()
+            raise
+
+        lrclib_backoff.succeed()
+
+        lyrics = next(((result["plainLyrics"], result["syncedLyrics"]) for result in data if result.get("plainLyrics") and result.get("syncedLyrics")), None)
+
+        if lyrics:
+            metadata_store.put("lyrics", lyrics_key, lyrics)
+            return lyrics
+
+        metadata_store.put("lyrics_not_found", lyrics_key, time.time() + LYRICS_NOT_FOUND_TTL)
+
     return [None, None]
@@ -0,0 +1,105 @@
+import collections, logging
+
+from concurrent.futures import ThreadPoolExecutor
+from mutagen import MutagenError
+
+from utils.constants import LYRICS_PREFETCH_IN_FLIGHT, LYRICS_PREFETCH_RESULTS
+from utils.id3_reader import read_tags
+from utils.lyrics_metadata import resolve_lyrics, lrclib_backoff
+from utils.compiled_lyrics import load_compiled_lyrics
+
+def load_track_lyrics(real_path: str, artist: str, title: str):
+    """Returns (synchronized lyrics, compiled lyrics or None, tier) for a track, see resolve_lyrics for the tiers. Runs on a prefetch worker."""
+    try:
+        tags = read_tags(real_path, with_info=False)
+    except (OSError, MutagenError) as e:
+        logging.debug(f"Couldn't read tags of {real_path} for lyrics: {e}")
+        tags = None
+
+    _, synchronized_lyrics, tier, _ = resolve_lyrics(artist, title, tags)
+
+    return synchronized_lyrics, load_compiled_lyrics(synchronized_lyrics) if synchronized_lyrics else None, tier
+
+def is_failed(future):
+    """Whether a finished lookup couldn't ask lrclib. Unlike "not found", that result mustn't be kept."""
+    return future.done() and (future.exception() is not None or future.result()[2] == "failed")
+
+class LyricsPrefetcher():
+    """Resolves the lyrics of upcoming tracks on worker threads, so a starting track neither waits for lrclib nor blocks the window.
+    At most max_in_flight prefetches run or wait at once, the track that starts always gets a worker."""
+    def __init__(self, max_in_flight: int=LYRICS_PREFETCH_IN_FLIGHT, max_results: int=LYRICS_PREFETCH_RESULTS):
+        self.max_in_flight = max_in_flight
+        self.max_results = max_results
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight + 1, thread_name_prefix="lyrics-prefetch")
+
+        self.futures = collections.OrderedDict() # real path -> future of load_track_lyrics, oldest first
+        self.current = None # (real path, future) of the track that started last, for views created while it runs
+
+        self.hits = 0 # resolved before the track started
+        self.late_hits = 0 # still resolving when it started
+        self.misses = 0 # never prefetched
+
+    def get_in_flight(self):
+        return sum(not future.done() for future in self.futures.values())
+
+    def prefetch(self, real_path: str, artist: str, title: str):
+        """Starts resolving a track's lyrics unless it is already known or too many prefetches are in flight. Returns whether it is queued or known."""
+        if real_path in self.futures:
+            if not is_failed(self.futures[real_path]):
+                self.futures.move_to_end(real_path)
+                return True
+
+            if not lrclib_backoff.is_ready(): # tried again once lrclib may be asked, not every frame
+                return True
+
+            del self.futures[real_path]
+
+        if self.get_in_flight() >= self.max_in_flight:
+            return False
+
+        self.futures[real_path] = self.executor.submit(load_track_lyrics, real_path, artist, title)
+
+        while len(self.futures) > self.max_results: # forget the oldest results, never the running ones
+            oldest_path = next((path for path, future in self.futures.items() if future.done()), None)
+            if oldest_path is None:
+                break
+            del self.futures[oldest_path]
+
+        return True
+
+    def take(self, real_path: str, artist: str, title: str):
+        """Returns the future of a starting track's lyrics, submitting it if it wasn't prefetched."""
+        future = self.futures.pop(real_path, None)
+
+        if future is not None and is_failed(future): # the track that starts gets another try
+            future = None
+
+        if future is None:
+            self.misses += 1
+            future = self.executor.submit(load_track_lyrics, real_path, artist, title)
+        elif future.done():
+            self.hits += 1
+        else:
+            self.late_hits += 1
+
+        self.current = (real_path, future)
+        logging.debug(f"Lyrics prefetch: {self.hits} hits, {self.late_hits} late hits, {self.misses} misses, {self.get_in_flight()} in flight")
+
+        return future
+
+    def get_current(self, real_path: str):
+        """The future take returned for real_path, if it is the track that started last."""
+        if self.current and self.current[0] == real_path:
+            return self.current[1]
+
+        return None
+
+lyrics_prefetcher = None
+
+def get_lyrics_prefetcher():
+    global lyrics_prefetcher
+
+    if lyrics_prefetcher is None:
+        lyrics_prefetcher = LyricsPrefetcher()
+
+    return lyrics_prefetcher
@@ -0,0 +1,213 @@
+import sqlite3, threading, atexit, collections, time, json, os, logging
+
+from utils.constants import METADATA_STORE_PATH, METADATA_CACHE_JSON_PATH, METADATA_FLUSH_INTERVAL, METADATA_CACHE_LIMITS
+from utils.cache_policy import CachePolicy
+
+NAMESPACES = ["query_results", "recordings", "artists", "albums", "lyrics", "lyrics_not_found"]
+
+# sections of metadata_cache.json -> namespaces, lyrics were nested by artist and title there
+JSON_SECTIONS = {"query_results": "query_results", "recording_by_id": "recordings", "artist_by_id": "artists", "album_by_id": "albums"}
+JSON_LYRICS_SECTIONS = {"lyrics_by_artist_title": "lyrics", "lyrics_not_found": "lyrics_not_found"}
+
+def get_lyrics_key(artist, title):
+    return json.dumps([artist or None, title]) # artist is None for lyrics found by title only
+
+class MetadataStore():
+    """MusicBrainz and lrclib results, one table per namespace, looked up and written one entry at a time.
+    Replaces metadata_cache.json, which had to be read and written as a whole for every lookup.
+    Entries are kept in memory once looked up or put. New ones are written behind, in one transaction every flush_interval seconds and at exit.
+    Every namespace has a CachePolicy: expired entries count as missing and the least recently used ones are evicted when a flush leaves it over its size."""
+    def __init__(self, path: str=METADATA_STORE_PATH, flush_interval: float=METADATA_FLUSH_INTERVAL, limits: dict=METADATA_CACHE_LIMITS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock() # the downloader and metadata threads share the store with the UI
+
+        self.policies = {namespace: CachePolicy(*limits[namespace]) for namespace in NAMESPACES}
+        self.entries = {namespace: collections.OrderedDict() for namespace in NAMESPACES} # namespace -> key -> (value as JSON or None if missing, stored time), least recently used first
+        self.dirty = {} # (namespace, key) -> (value as JSON, stored time), not written yet
+        self.accessed = {} # (namespace, key) -> access time, not written yet
+        self.flushes = 0
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL") # writes append to the log instead of rewriting pages, readers don't block them
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        for namespace in NAMESPACES:
+            self.create_table(namespace)
+        self.connection.commit()
+
+        self.stopped = threading.Event()
+        self.flush_thread = threading.Thread(target=self.run, daemon=True)
+        self.flush_thread.start()
+        atexit.register(self.close)
+
+    def create_table(self, namespace: str):
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {namespace} (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_time REAL NOT NULL DEFAULT 0, access_time REAL NOT NULL DEFAULT 0)")
+
+        columns = [row[1] for row in self.connection.execute(f"PRAGMA table_info({namespace})")]
+        if not "stored_time" in columns: # stores from before cache policies, their entries count as new
+            self.connection.execute(f"ALTER TABLE {namespace} ADD COLUMN stored_time REAL NOT NULL DEFAULT 0")
+            self.connection.execute(f"ALTER TABLE {namespace} ADD COLUMN access_time REAL NOT NULL DEFAULT 0")
+            self.connection.execute(f"UPDATE {namespace} SET stored_time = ?, access_time = ?", (time.time(), time.time()))
+
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS {namespace}_access_time ON {namespace} (access_time)")
+
+    def get(self, namespace: str, key: str, default=None):
+        """The stored value, or default. Values can be None themselves, like queries without a recording, so pass a default to tell them apart."""
+        now = time.time()
+
+        with self.lock:
+            entries, policy = self.entries[namespace], self.policies[namespace]
+
+            entry = entries.get(key)
+            if entry is None:
+                row = self.connection.execute(f"SELECT value, stored_time FROM {namespace} WHERE key = ?", (key,)).fetchone()
+                entry = entries[key] = row if row else (None, 0)
+
+                if len(entries) > policy.max_size:
+                    entries.popitem(last=False)
+            else:
+                entries.move_to_end(key)
+
+            value, stored_time = entry
+            if value is None or policy.is_expired(stored_time, now):
+                policy.misses += 1
+                return default
+
+            policy.hits += 1
+            self.accessed[(namespace, key)] = now
+
+        return json.loads(value) # parsed again every time, so callers can't change the cached entry
+
+    def put(self, namespace: str, key: str, value):
+        entry = (json.dumps(value), time.time())
+
+        with self.lock:
+            entries = self.entries[namespace]
+            entries[key] = entry
+            entries.move_to_end(key)
+
+            if len(entries) > self.policies[namespace].max_size:
+                entries.popitem(last=False)
+
+            self.dirty[(namespace, key)] = entry
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes the dirty entries and access times in one transaction, so the file holds either all of them or none, then evicts what is over the limits."""
+        with self.lock:
+            if not self.dirty and not self.accessed:
+                return
+
+            dirty, self.dirty = self.dirty, {}
+            accessed, self.accessed = self.accessed, {}
+
+            for namespace in NAMESPACES:
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO {namespace} (key, value, stored_time, access_time) VALUES (?, ?, ?, ?)",
+                    [(key, value, stored_time, stored_time) for (entry_namespace, key), (value, stored_time) in dirty.items() if entry_namespace == namespace]
+                )
+                self.connection.executemany(
+                    f"UPDATE {namespace} SET access_time = ? WHERE key = ?",
+                    [(access_time, key) for (entry_namespace, key), access_time in accessed.items() if entry_namespace == namespace and not (entry_namespace, key) in dirty]
+                )
+
+            evicted = self.evict(set(namespace for namespace, _ in dirty)) if dirty else 0 # only puts make a namespace grow
+
+            self.connection.commit()
+            self.flushes += 1
+
+        if evicted:
+            logging.debug(f"Metadata store evicted {evicted} entries. " + "; ".join(f"{namespace}: {policy.format_stats()}" for namespace, policy in self.policies.items()))
+
+    def evict(self, namespaces: set):
+        """Deletes expired entries, then the least recently used ones over max_size. Returns the amount of deleted entries."""
+        evicted = 0
+
+        for namespace in namespaces:
+            policy = self.policies[namespace]
+
+            if policy.ttl is not None:
+                evicted_entries = self.connection.execute(f"DELETE FROM {namespace} WHERE stored_time < ?", (policy.get_expiry_time(),)).rowcount
+                policy.evictions += evicted_entries
+                evicted += evicted_entries
+
+            excess = self.connection.execute(f"SELECT COUNT(*) FROM {namespace}").fetchone()[0] - policy.max_size
+            if excess > 0:
+                self.connection.execute(f"DELETE FROM {namespace} WHERE key IN (SELECT key FROM {namespace} ORDER BY access_time LIMIT ?)", (excess,))
+                policy.evictions += excess
+                evicted += excess
+                self.entries[namespace].clear() # doesn't know which keys are gone
+
+        return evicted
+
+    def put_many(self, namespace: str, items):
+        """Writes right away, for migrating. Entries looked up before are dropped from memory."""
+        now = time.time()
+
+        with self.lock:
+            self.connection.executemany(f"INSERT OR REPLACE INTO {namespace} (key, value, stored_time, access_time) VALUES (?, ?, ?, ?)", [(key, json.dumps(value), now, now) for key, value in items])
+            self.evict({namespace})
+            self.connection.commit()
+            self.entries[namespace].clear()
+
+    def get_stats(self):
+        return {namespace: policy.get_stats() for namespace, policy in self.policies.items()}
+
+    def migrate_json(self, json_path: str=METADATA_CACHE_JSON_PATH):
+        """Imports a metadata_cache.json once, then renames it so it isn't imported again. Returns the amount of imported entries."""
+        if not os.path.isfile(json_path):
+            return 0
+
+        try:
+            with open(json_path, "r") as file:
+                metadata_cache = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f"Couldn't migrate {json_path}: {e}")
+            return 0
+
+        imported = 0
+
+        for section, namespace in JSON_SECTIONS.items():
+            items = list(metadata_cache.get(section, {}).items())
+            self.put_many(namespace, items)
+            imported += len(items)
+
+        for section, namespace in JSON_LYRICS_SECTIONS.items():
+            items = [
+                (get_lyrics_key(None if artist == "null" else artist, title), value) # JSON turned the None artist into "null"
+                for artist, titles in metadata_cache.get(section, {}).items() for title, value in titles.items()
+            ]
+            self.put_many(namespace, items)
+            imported += len(items)
+
+        os.replace(json_path, f"{json_path}.migrated")
+        logging.info(f"Migrated {imported} entries from {json_path} to {self.path}")
+
+        return imported
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+
+        self.stopped.set()
+        self.flush()
+
+        with self.lock:
+            self.connection.close()
+
+metadata_store = None
+metadata_store_lock = threading.Lock()
+
+def get_metadata_store():
+    global metadata_store
+
+    with metadata_store_lock: # first used from whichever thread looks something up first
+        if metadata_store is None:
+            metadata_store = MetadataStore()
+            metadata_store.migrate_json()
+
+    return metadata_store
@@ -1,13 +1,17 @@
-import io, tempfile, re, os, logging, arcade, time
+import io, tempfile, re, os, logging, time
 
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, TXXX, SYLT, ID3NoHeaderError
+from typing import Iterable
+
+from mutagen.id3 import TXXX, SYLT
 
 from pydub import AudioSegment
 from PIL import Image
 
 from utils.lyrics_metadata import parse_synchronized_lyrics
 from utils.utils import convert_seconds_to_date
+from utils.id3_reader import read_tags
+from utils.thumbnail_pack import get_cover_hash, get_thumbnail_pack
+from utils.texture_residency import get_texture_residency
 
 def truncate_end(text: str, max_length: int) -> str:
     if len(text) <= max_length:
@@ -16,12 +20,15 @@ def truncate_end(text: str, max_length: int) -> str:
         return text
     return text[:max_length - 3] + '...'
 
-def extract_metadata_and_thumbnail(file_path: str, thumb_resolution: tuple):
+def read_metadata(file_path: str, thumb_resolution: tuple, known_cover_hashes: set | frozenset=frozenset()):
+    """Reads tags and stream info. Covers are only decoded and resized if their hash isn't in known_cover_hashes.
+    Runs in scan worker processes, so it never opens the thumbnail pack, the caller passes what the pack has. A set gets the covers decoded here added."""
     artist = "Unknown"
     title = ""
     source_url = "Unknown"
     uploader_url = "Unknown"
-    thumb_texture = None
+    thumb_data = None
+    cover_hash = None
     sound_length = 0
     bitrate = 0
     sample_rate = 0
@@ -33,44 +40,48 @@ def extract_metadata_and_thumbnail(file_path: str, thumb_resolution: tuple):
     name_only = os.path.splitext(basename)[0]
 
     try:
-        try:
-            easyid3 = EasyID3(file_path)
-            if "artist" in easyid3:  
-                artist = easyid3["artist"][0]
-            if "title" in easyid3:
-                title  = easyid3["title"][0]
-            if "date" in easyid3:
-                upload_year = int(re.match(r"\d{4}", easyid3["date"][0]).group())
-
-            id3 = ID3(file_path)
-            for frame in id3.getall("WXXX"):
-                desc = frame.desc.lower()
-                if desc == "uploader":
-                    uploader_url = frame.url
-                elif desc == "source":
-                    source_url = frame.url
-            for frame in id3.getall("TXXX"):
-                desc = frame.desc.lower()
-                if desc == "last_played":
-                    last_played = float(frame.text[0])
-                elif desc == "play_count":
-                    play_count = int(frame.text[0])
-        
-            if hasattr(easyid3, "info"):
-                sound_length = round(easyid3.info.length, 2)
-                bitrate = int((easyid3.info.bitrate or 0) / 1000)
-                sample_rate = int(easyid3.info.sample_rate / 1000)
-
-            apic = id3.getall("APIC")
-            thumb_image_data = apic[0].data if apic else None
-
-            if thumb_image_data:
-                pil_image = Image.open(io.BytesIO(thumb_image_data)).convert("RGBA")
-                pil_image = pil_image.resize(thumb_resolution)
-                thumb_texture = arcade.Texture(pil_image)
-
-        except ID3NoHeaderError:
-            pass
+        tags = read_tags(file_path)
+
+        artist = tags.get_easy("artist", artist)
+        title = tags.get_easy("title", title)
+        date = tags.get_easy("date")
+        if date:
+            upload_year = int(re.match(r"\d{4}", date).group())
+
+        for frame in tags.id3.getall("WXXX"):
+            desc = frame.desc.lower()
+            if desc == "uploader":
+                uploader_url = frame.url
+            elif desc == "source":
+                source_url = frame.url
+        for frame in tags.id3.getall("TXXX"):
+            desc = frame.desc.lower()
+            if desc == "last_played":
+                last_played = float(frame.text[0])
+            elif desc == "play_count":
+                play_count = int(frame.text[0])
+
+        if tags.info:
+            sound_length = round(tags.info.length, 2)
+            bitrate = int((tags.info.bitrate or 0) / 1000)
+            sample_rate = int(tags.info.sample_rate / 1000)
+
+        cover_frame = tags.get_cover_frame()
+
+        if cover_frame:
+            cover_hash = get_cover_hash(cover_frame.data)
+
+            if not cover_hash in known_cover_hashes: # decoded and resized for another track or an earlier run already
+                try:
+                    pil_image = Image.open(io.BytesIO(cover_frame.data)).convert("RGBA")
+                    pil_image = pil_image.resize(thumb_resolution)
+                    thumb_data = pil_image.tobytes()
+                except Exception as e:
+                    cover_hash = None # no pack entry will exist for it, so the index row mustn't point to one
+                    logging.debug(f"[Thumbnail Error] {file_path}: {e}")
+                else:
+                    if isinstance(known_cover_hashes, set):
+                        known_cover_hashes.add(cover_hash)
 
     except Exception as e:
         logging.debug(f"[Metadata/Thumbnail Error] {file_path}: {e}")
@@ -83,12 +94,12 @@ def extract_metadata_and_thumbnail(file_path: str, thumb_resolution: tuple):
 
     if not title: 
         title = name_only
-    
-    if thumb_texture is None:
-        from utils.preload import music_icon
-        thumb_texture = music_icon
 
-    file_size = round(os.path.getsize(file_path) / (1024 ** 2), 2)
+    try:
+        file_size = round(os.path.getsize(file_path) / (1024 ** 2), 2)
+    except OSError as e: # deleted or moved since it was listed
+        logging.debug(f"[Metadata Error] {file_path}: {e}")
+        file_size = 0
 
     return {
         "sound_length": sound_length,
@@ -102,10 +113,34 @@ def extract_metadata_and_thumbnail(file_path: str, thumb_resolution: tuple):
         "source_url": source_url,
         "artist": artist,
         "title": title,
-        "thumbnail": thumb_texture,
+        "cover_hash": cover_hash,
+        "thumbnail_data": thumb_data, # raw RGBA pixels at thumb_resolution, only if the thumbnail pack doesn't have them yet
     }
 
-def adjust_volume(input_path, volume):
+def get_thumbnail_stats(file_metadata: Iterable[dict], thumb_resolution: tuple):
+    """Covers used by the given tracks versus the textures actually resident for them."""
+    cover_hashes = [metadata["cover_hash"] for metadata in file_metadata if metadata.get("cover_hash")]
+    unique_covers = len(set(cover_hashes))
+    texture_residency = get_texture_residency()
+    thumbnail_pack = get_thumbnail_pack()
+
+    return {
+        "total_covers": len(cover_hashes),
+        "unique_covers": unique_covers,
+        "textures": len(texture_residency.textures),
+        "resident_bytes": texture_residency.size,
+        "atlas_bytes_saved": (len(cover_hashes) - unique_covers) * thumb_resolution[0] * thumb_resolution[1] * 4,
+        "texture_loads": texture_residency.loads,
+        "texture_evictions": texture_residency.evictions,
+        "pack_hits": thumbnail_pack.hits,
+        "pack_misses": thumbnail_pack.misses
+    }
+
+def to_file_metadata(metadata: dict):
+    # thumbnails are in the thumbnail pack by now, textures are made on demand by the texture residency
+    return {key: value for key, value in metadata.items() if key != "thumbnail_data"}
+
+def adjust_volume(input_path, volume, tags=None):
     audio = AudioSegment.from_file(input_path)
     change = volume - audio.dBFS
 
@@ -113,44 +148,35 @@ def adjust_volume(input_path, volume):
         return
 
     try:
-        easy_tags = EasyID3(input_path)
-        tags = dict(easy_tags)
-        tags = {k: v[0] if isinstance(v, list) else v for k, v in tags.items()}
+        tags = tags or read_tags(input_path, with_info=False)
+        easy_tags = tags.get_easy_dict()
     except Exception as e:
-        tags = {}
-
-    try:
-        id3 = ID3(input_path)
-        apic_frames = [f for f in id3.values() if f.FrameID == "APIC"]
-        cover_path = None
-        if apic_frames:
-            apic = apic_frames[0]
-            ext = ".jpg" if apic.mime == "image/jpeg" else ".png"
-            temp_cover = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-            temp_cover.write(apic.data)
-            temp_cover.close()
-            cover_path = temp_cover.name
-        else:
-            cover_path = None
-    except Exception as e:
-        cover_path = None
+        tags = None
+        easy_tags = {}
+
+    cover_path = None
+    apic = tags.get_cover_frame() if tags else None
+    if apic:
+        ext = ".jpg" if apic.mime == "image/jpeg" else ".png"
+        temp_cover = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
+        temp_cover.write(apic.data)
+        temp_cover.close()
+        cover_path = temp_cover.name
 
     audio = audio.apply_gain(change)
 
     export_args = {
         "format": "mp3",
-        "tags": tags
+        "tags": easy_tags
     }
     if cover_path:
         export_args["cover"] = cover_path
 
     audio.export(input_path, **export_args)
 
-def update_last_play_statistics(filepath):
-    try:
-        audio = ID3(filepath)
-    except ID3NoHeaderError:
-        audio = ID3()
+def update_last_play_statistics(filepath, tags=None):
+    tags = tags or read_tags(filepath, with_info=False)
+    audio = tags.id3
 
     audio.setall("TXXX:last_played", [TXXX(desc="last_played", text=str(time.time()))])
 
@@ -165,7 +191,7 @@ def update_last_play_statistics(filepath):
 
     audio.setall("TXXX:play_count", [TXXX(desc="play_count", text=str(count + 1))])
 
-    audio.save(filepath)
+    tags.save()
 
 def convert_timestamp_to_time_ago(timestamp):
     current_timestamp = time.time()
@@ -176,30 +202,24 @@ def convert_timestamp_to_time_ago(timestamp):
         return "Never"
 
 def add_metadata_to_file(file_path, musicbrainz_artist_ids, artist, title, synchronized_lyrics, isrc, acoustid_id=None):
-    easyid3 = EasyID3(file_path)
-    easyid3["musicbrainz_artistid"] = musicbrainz_artist_ids
-    easyid3["artist"] = artist
-    easyid3["title"] = title
-    easyid3["isrc"] = isrc
+    tags = read_tags(file_path, with_info=False)
+    tags.set_easy("musicbrainz_artistid", musicbrainz_artist_ids)
+    tags.set_easy("artist", artist)
+    tags.set_easy("title", title)
+    tags.set_easy("isrc", isrc)
 
     if acoustid_id:
-        easyid3["acoustid_id"] = acoustid_id
+        tags.set_easy("acoustid_id", acoustid_id)
 
-    try:
-        easyid3.save()
-    except:
-        pass
-
-    id3 = ID3(file_path)
-    id3.delall("SYLT")
+    tags.id3.delall("SYLT")
 
     if synchronized_lyrics:
         lyrics_dict = parse_synchronized_lyrics(synchronized_lyrics)[1]
         synchronized_lyrics_tuples = [(text, int(lyrics_time * 1000)) for lyrics_time, text in lyrics_dict.items()] # * 1000 because format 2 means milliseconds
 
-        id3.add(SYLT(encoding=3, lang="eng", format=2, type=1, desc="From lrclib", text=synchronized_lyrics_tuples))
+        tags.id3.add(SYLT(encoding=3, lang="eng", format=2, type=1, desc="From lrclib", text=synchronized_lyrics_tuples))
     
     try:
-        id3.save()
+        tags.save()
     except:
-        pass
\ No newline at end of file
+        pass
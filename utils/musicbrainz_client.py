@@ -0,0 +1,118 @@
+import threading, itertools, time, json
+
+import musicbrainzngs as music_api
+
+from concurrent.futures import Future
+
+from utils.constants import MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT, MUSICBRAINZ_RATE, MUSICBRAINZ_BURST
+
+INTERACTIVE = 0 # a view waits for it
+BACKGROUND = 1 # enrichment, like the downloader caching metadata
+
+class TokenBucket():
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+
+    def get_wait_time(self):
+        """Seconds until a token is available, 0 if one is."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class MusicBrainzClient():
+    """Every MusicBrainz call goes through here, from the UI thread, the metadata viewer and the downloader alike.
+    A token bucket keeps to MusicBrainz' one request per second, identical calls in flight share one request and interactive calls go before background ones."""
+    def __init__(self, rate: float=MUSICBRAINZ_RATE, burst: float=MUSICBRAINZ_BURST):
+        music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
+        music_api.set_rate_limit(False) # its own limiter serves callers in whatever order they grab its lock, the bucket replaces it
+
+        self.bucket = TokenBucket(rate, burst)
+        self.condition = threading.Condition()
+        self.waiting = [] # [priority, sequence] tickets of calls waiting for a token, the smallest goes next
+        self.in_flight = {} # call key -> (ticket, future)
+        self.sequence = itertools.count()
+
+        self.requests = 0
+        self.coalesced = 0
+        self.wait_time = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def call(self, function_name: str, *args, priority: int=INTERACTIVE, **kwargs):
+        """Calls musicbrainzngs.<function_name>, or waits for the identical call another thread already makes."""
+        key = json.dumps([function_name, args, kwargs], sort_keys=True, default=str)
+
+        with self.condition:
+            shared = key in self.in_flight
+
+            if shared:
+                ticket, future = self.in_flight[key]
+                self.coalesced += 1
+
+                if priority < ticket[0]: # an interactive caller waits for it now
+                    ticket[0] = priority
+                    self.condition.notify_all()
+            else:
+                ticket, future = [priority, next(self.sequence)], Future()
+                self.in_flight[key] = (ticket, future)
+
+        if shared:
+            return future.result() # raises the error of the shared call too
+
+        start_time = time.perf_counter()
+
+        try:
+            self.acquire(ticket)
+            self.wait_time[ticket[0]] += time.perf_counter() - start_time
+            self.requests += 1
+
+            result = getattr(music_api, function_name)(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.condition:
+                del self.in_flight[key]
+
+    def acquire(self, ticket: list):
+        with self.condition:
+            self.waiting.append(ticket)
+            self.condition.notify_all() # the waiting calls check again whether they are still next
+
+            while True:
+                if min(self.waiting) is ticket:
+                    wait_time = self.bucket.get_wait_time()
+
+                    if wait_time <= 0:
+                        self.bucket.take()
+                        self.waiting.remove(ticket)
+                        self.condition.notify_all()
+                        return
+
+                    self.condition.wait(wait_time)
+                else:
+                    self.condition.wait()
+
+    def format_stats(self):
+        return f"{self.requests} requests, {self.coalesced} coalesced, {self.wait_time[INTERACTIVE]:.1f} s waited by interactive and {self.wait_time[BACKGROUND]:.1f} s by background calls"
+
+musicbrainz_client = None
+musicbrainz_client_lock = threading.Lock()
+
+def get_musicbrainz_client():
+    global musicbrainz_client
+
+    with musicbrainz_client_lock: # used from the downloader thread too
+        if musicbrainz_client is None:
+            musicbrainz_client = MusicBrainzClient()
+
+    return musicbrainz_client
@@ -1,10 +1,13 @@
-import musicbrainzngs as music_api
+from concurrent.futures import ThreadPoolExecutor
 
-from utils.constants import MUSICBRAINZ_PROJECT_NAME, MUSICBRAINZ_CONTACT, MUSCIBRAINZ_VERSION, MUSIC_TITLE_WORD_BLACKLIST
+from utils.constants import MUSIC_TITLE_WORD_BLACKLIST
 from utils.lyrics_metadata import get_lyrics
-from utils.utils import ensure_metadata_file
+from utils.metadata_store import get_metadata_store
+from utils.musicbrainz_client import get_musicbrainz_client, INTERACTIVE
 
-import json, iso3166
+import iso3166, time, logging
+
+MISSING = object() # queries can be cached without a recording
 
 def get_country(code):
     country = iso3166.countries.get(code, None)
@@ -25,55 +28,60 @@ def finalize_blacklist(title):
 def is_release_valid(release):
     return release.get("release-event-count", 0) == 0 # only include albums
 
-def get_artists_metadata(artist_ids):
-    metadata_cache = ensure_metadata_file()
+def timed(function, *args):
+    """Runs function, returns its result and how long it took in seconds."""
+    start_time = time.perf_counter()
+    return function(*args), time.perf_counter() - start_time
+
+def get_artist_metadata(artist_id, priority=INTERACTIVE):
+    """Returns (name, metadata) of an artist."""
+    metadata_store = get_metadata_store()
+
+    data = metadata_store.get("artists", artist_id)
+    if data is not None:
+        return data["name"], data
+
+    artist_data = get_musicbrainz_client().call("get_artist_by_id", artist_id, includes=["annotation", "releases", "url-rels"], priority=priority)["artist"]
+
+    metadata = {
+        "name": artist_data["name"],
+        "musicbrainz_id": artist_id,
+        "example_tracks": [release["title"] for release in artist_data.get("release-list", [])[:3]],
+        "gender": artist_data.get("gender", "Unknown"),
+        "country": get_country(artist_data.get("country", "WZ")) or "Unknown",
+        "tag-list": [tag["name"] for tag in artist_data.get("tag_list", [])],
+        "ipi-list": artist_data.get("ipi-list", []),
+        "isni-list": artist_data.get("isni-list", []),
+        "born": artist_data.get("life-span", {}).get("begin", "Unknown"),
+        "dead": artist_data.get("life-span", {}).get("ended", "Unknown").lower() == "true",
+        "comment": artist_data.get("disambiguation", "None"),
+        "urls": {}
+    }
 
-    artist_metadata = {}
+    for url_data in artist_data.get("url-relation-list", []):
+        url_type = url_data.get("type", "").lower()
+        url_target = url_data.get("target", "")
+        if not url_type or not url_target or not url_type in ["youtube", "imdb", "viaf", "soundcloud", "wikidata", "last.fm", "lyrics", "official homepage"]:
+            continue
 
-    for artist_id in artist_ids:
-        if artist_id in metadata_cache["artist_by_id"]:
-            data = metadata_cache["artist_by_id"][artist_id]
-            name = data["name"]
-            artist_metadata[name] = data
+        if url_type in metadata["urls"]:
+            metadata["urls"][url_type].append(url_target)
         else:
-            artist_data = music_api.get_artist_by_id(artist_id, includes=["annotation", "releases", "url-rels"])["artist"]
-
-            metadata = {
-                "name": artist_data["name"],
-                "musicbrainz_id": artist_id,
-                "example_tracks": [release["title"] for release in artist_data.get("release-list", [])[:3]],
-                "gender": artist_data.get("gender", "Unknown"),
-                "country": get_country(artist_data.get("country", "WZ")) or "Unknown",
-                "tag-list": [tag["name"] for tag in artist_data.get("tag_list", [])],
-                "ipi-list": artist_data.get("ipi-list", []),
-                "isni-list": artist_data.get("isni-list", []),
-                "born": artist_data.get("life-span", {}).get("begin", "Unknown"),
-                "dead": artist_data.get("life-span", {}).get("ended", "Unknown").lower() == "true",
-                "comment": artist_data.get("disambiguation", "None"),
-                "urls": {}
-            }
+            metadata["urls"][url_type] = [url_target]
 
-            for url_data in artist_data.get("url-relation-list", []):
-                url_type = url_data.get("type", "").lower()
-                url_target = url_data.get("target", "")
-                if not url_type or not url_target or not url_type in ["youtube", "imdb", "viaf", "soundcloud", "wikidata", "last.fm", "lyrics", "official homepage"]:
-                    continue
+    metadata_store.put("artists", artist_id, metadata)
 
-                if url_type in metadata["urls"]:
-                    metadata["urls"][url_type].append(url_target)
-                else:
-                    metadata["urls"][url_type] = [url_target]
+    return artist_data["name"], metadata
 
-            artist_metadata[artist_data["name"]] = metadata
-            metadata_cache["artist_by_id"][artist_id] = metadata
-    
-    with open("metadata_cache.json", "w") as file:
-        file.write(json.dumps(metadata_cache))
+def get_artists_metadata(artist_ids, priority=INTERACTIVE):
+    if len(artist_ids) < 2:
+        return dict(get_artist_metadata(artist_id, priority) for artist_id in artist_ids)
 
-    return artist_metadata
+    with ThreadPoolExecutor(max_workers=len(artist_ids)) as executor: # cached artists don't wait behind the ones MusicBrainz is asked for
+        return dict(executor.map(lambda artist_id: get_artist_metadata(artist_id, priority), artist_ids)) # in credit order
 
 def extract_release_metadata(release_list):
-    metadata_cache = ensure_metadata_file()
+    metadata_store = get_metadata_store()
 
     album_metadata = {}
 
@@ -88,9 +96,8 @@ def extract_release_metadata(release_list):
             continue
 
         if release.get("status") == "Official":
-            if release_id in metadata_cache["album_by_id"]:
-                album_metadata[release_id] = metadata_cache["album_by_id"][release_id]
-            else:
+            album_metadata[release_id] = metadata_store.get("albums", release_id)
+            if album_metadata[release_id] is None:
                 album_metadata[release_id] = {
                     "musicbrainz_id": release.get("id") if release else "Unknown",
                     "album_name": release.get("title") if release else "Unknown",
@@ -98,21 +105,17 @@ def extract_release_metadata(release_list):
                     "album_country": (get_country(release.get("country", "WZ")) or "Worldwide") if release else "Unknown",
                     "album_tracks": [track['recording']['title'] for track in release.get('medium-list', [{}])[0].get('track-list', [])[:3]]
                 }
-                metadata_cache["album_by_id"][release_id] = album_metadata[release_id]
-
-    with open("metadata_cache.json", "w") as file:
-        file.write(json.dumps(metadata_cache))
+                metadata_store.put("albums", release_id, album_metadata[release_id])
 
     return album_metadata
 
-def get_album_metadata(album_id):
-    metadata_cache = ensure_metadata_file()
+def get_album_metadata(album_id, priority=INTERACTIVE):
+    metadata_store = get_metadata_store()
 
-    release = music_api.get_release_by_id(album_id, includes=["recordings"])["release"]
+    release = get_musicbrainz_client().call("get_release_by_id", album_id, includes=["recordings"], priority=priority)["release"]
 
-    if album_id in metadata_cache["album_by_id"]:
-        album_metadata = metadata_cache["album_by_id"][release["id"]]
-    else:
+    album_metadata = metadata_store.get("albums", release["id"])
+    if album_metadata is None:
         album_metadata = {
             "musicbrainz_id": release.get("id") if release else "Unknown",
             "album_name": release.get("title") if release else "Unknown",
@@ -120,17 +123,21 @@ def get_album_metadata(album_id):
             "album_country": (get_country(release.get("country", "WZ")) or "Worldwide") if release else "Unknown",
             "album_tracks": [track['recording']['title'] for track in release.get('medium-list', [{}])[0].get('track-list', [])[:3]]
         }
-        metadata_cache["album_by_id"][release["id"]] = album_metadata
-
-    with open("metadata_cache.json", "w") as file:
-        file.write(json.dumps(metadata_cache))
+        metadata_store.put("albums", release["id"], album_metadata)
 
     return album_metadata
 
-def get_music_metadata(artist=None, title=None, musicbrainz_id=None):
-    metadata_cache = ensure_metadata_file()
+def get_recording_lyrics(artist_names, artists_future, title):
+    if artist_names is None: # recordings cached before names were, the artists have to be looked up first
+        artist_names = list(artists_future.result()[0])
+
+    return get_lyrics(', '.join(artist_names), title)
 
-    music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
+def get_music_metadata(artist=None, title=None, musicbrainz_id=None, priority=INTERACTIVE):
+    """Returns music, artist, album and lyrics metadata, and the seconds each stage took.
+    Once the recording is known, its artists, releases and lyrics are looked up at the same time."""
+    metadata_store = get_metadata_store()
+    start_time = time.perf_counter()
 
     if not musicbrainz_id:
         if artist:
@@ -138,12 +145,11 @@ def get_music_metadata(artist=None, title=None, musicbrainz_id=None):
         else:
             query = title
 
-        recording_id = None
+        recording_id = metadata_store.get("query_results", query, MISSING)
 
-        if query in metadata_cache["query_results"]:
-            recording_id = metadata_cache["query_results"][query]
-        else:
-            results = music_api.search_recordings(query=query, limit=100)["recording-list"]
+        if recording_id is MISSING:
+            recording_id = None
+            results = get_musicbrainz_client().call("search_recordings", query=query, limit=100, priority=priority)["recording-list"]
 
             finalized_blacklist = finalize_blacklist(title)            
 
@@ -157,29 +163,31 @@ def get_music_metadata(artist=None, title=None, musicbrainz_id=None):
                 recording_id = r["id"]
                 break
 
-            metadata_cache["query_results"][query] = recording_id
+            metadata_store.put("query_results", query, recording_id)
     else:
         recording_id = musicbrainz_id
 
-    if recording_id in metadata_cache["recording_by_id"]:
-        detailed = metadata_cache["recording_by_id"][recording_id]
-    else:
+    detailed = metadata_store.get("recordings", recording_id) if recording_id else None
+
+    if detailed is None:
         if recording_id:
-            detailed = music_api.get_recording_by_id(
+            detailed = get_musicbrainz_client().call(
+                "get_recording_by_id",
                 recording_id,
-                includes=["artists", "releases", "isrcs", "tags", "ratings"]
+                includes=["artists", "releases", "isrcs", "tags", "ratings"],
+                priority=priority
             )["recording"]
-            metadata_cache["recording_by_id"][recording_id] = {
+            metadata_store.put("recordings", recording_id, {
                 "title": detailed["title"],
-                "artist-credit": [{"artist": {"id": artist_data["artist"]["id"]}} for artist_data in detailed.get("artist-credit", {}) if isinstance(artist_data, dict)],
+                "artist-credit": [{"artist": {"id": artist_data["artist"]["id"], "name": artist_data["artist"].get("name")}} for artist_data in detailed.get("artist-credit", {}) if isinstance(artist_data, dict)],
                 "isrc-list":  detailed["isrc-list"] if "isrc-list" in detailed else [],
                 "rating": {"rating": detailed["rating"]["rating"]} if "rating" in detailed else {},
                 "tags": detailed.get("tag-list", []),
                 "release-list": [{"id": release["id"], "title": release["title"], "status": release.get("status"), "date": release.get("date"), "country": release.get("country", "WZ")} for release in detailed["release-list"]] if "release-list" in detailed else [],
                 "release-event-count": detailed.get("release-event-count", 0)
-            }
+            })
         else:
-            detailed = metadata_cache["recording_by_id"][recording_id] = {
+            detailed = {
                 "title": title,
                 "artist-credit": [],
                 "isrc-list": [],
@@ -189,12 +197,23 @@ def get_music_metadata(artist=None, title=None, musicbrainz_id=None):
                 "release-event-count": 0
             }
 
-    with open("metadata_cache.json", "w") as file:
-        file.write(json.dumps(metadata_cache))
+    stage_times = {"recording": time.perf_counter() - start_time}
 
-    artist_ids = [artist_data["artist"]["id"] for artist_data in detailed.get("artist-credit", {}) if isinstance(artist_data, dict)] # isinstance is needed, because sometimes & is included as an artist str
-    artist_metadata = get_artists_metadata(artist_ids)
-    album_metadata = extract_release_metadata(detailed.get("release-list", []))
+    artist_credits = [artist_data["artist"] for artist_data in detailed.get("artist-credit", {}) if isinstance(artist_data, dict)] # isinstance is needed, because sometimes & is included as an artist str
+    artist_ids = [artist_credit["id"] for artist_credit in artist_credits]
+    artist_names = [artist_credit["name"] for artist_credit in artist_credits] if all(artist_credit.get("name") for artist_credit in artist_credits) else None
+
+    with ThreadPoolExecutor(max_workers=3) as executor: # MusicBrainz calls still take their turn in the rate limiter, lrclib doesn't wait for them
+        artists_future = executor.submit(timed, get_artists_metadata, artist_ids, priority)
+        albums_future = executor.submit(timed, extract_release_metadata, detailed.get("release-list", []))
+        lyrics_future = executor.submit(timed, get_recording_lyrics, artist_names, artists_future, detailed["title"])
+
+        artist_metadata, stage_times["artists"] = artists_future.result()
+        album_metadata, stage_times["albums"] = albums_future.result()
+        lyrics_metadata, stage_times["lyrics"] = lyrics_future.result()
+
+    stage_times["total"] = time.perf_counter() - start_time
+    logging.debug(f"Metadata of {detailed['title']}: " + ", ".join(f"{stage} {stage_time * 1000:.0f} ms" for stage, stage_time in stage_times.items()))
 
     music_metadata = {
         "musicbrainz_id": recording_id,
@@ -202,11 +221,10 @@ def get_music_metadata(artist=None, title=None, musicbrainz_id=None):
         "musicbrainz_rating": detailed["rating"]["rating"] if "rating" in detailed.get("rating", {}) else "Unknown",
         "tags": [tag["name"] for tag in detailed.get("tag-list", [])]
     }
-    return music_metadata, artist_metadata, album_metadata, get_lyrics(', '.join([artist for artist in artist_metadata]), detailed["title"])
+    return music_metadata, artist_metadata, album_metadata, lyrics_metadata, stage_times
 
 def search_recordings(search_term):
-    music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
-    results = music_api.search_recordings(query=search_term, limit=100)["recording-list"]
+    results = get_musicbrainz_client().call("search_recordings", query=search_term, limit=100)["recording-list"]
 
     finalized_blacklist = finalize_blacklist(search_term)
 
@@ -225,9 +243,7 @@ def search_recordings(search_term):
     return output_list
 
 def search_artists(search_term):
-    music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
-    
-    results = music_api.search_artists(query=search_term)
+    results = get_musicbrainz_client().call("search_artists", query=search_term)
 
     output_list = []
 
@@ -237,9 +253,7 @@ def search_artists(search_term):
     return output_list
 
 def search_albums(search_term):
-    music_api.set_useragent(MUSICBRAINZ_PROJECT_NAME, MUSCIBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
-
-    results = music_api.search_releases(search_term)
+    results = get_musicbrainz_client().call("search_releases", search_term)
 
     output_list = []
 
@@ -0,0 +1,107 @@
+import collections, logging, time, arcade
+
+from PIL import Image
+
+from utils.constants import THUMBNAIL_MEMORY_BUDGET, ATLAS_COMPACT_EVICTIONS
+from utils.thumbnail_pack import get_thumbnail_pack
+
+class TextureResidency():
+    """Keeps the thumbnail textures of visible and recently visible Cards under a byte budget.
+    Evicted textures leave the atlas once nothing draws them anymore, their pixels stay in the thumbnail pack and are reloaded when a Card asks for them again."""
+    def __init__(self, budget: int=THUMBNAIL_MEMORY_BUDGET, compact_evictions: int=ATLAS_COMPACT_EVICTIONS):
+        self.budget = budget
+        self.compact_evictions = compact_evictions
+
+        self.textures = collections.OrderedDict() # (cover hash, width, height) -> texture, least recently used first
+        self.size = 0
+        self.pending = collections.OrderedDict() # covers asked for while not resident, the most recent ask is loaded first
+
+        self.loads = 0
+        self.evictions = 0
+        self.evictions_since_compact = 0
+
+    def get(self, cover_hash: str, thumb_resolution: tuple):
+        """Returns the texture of a cover, or None and queues it for load_pending if it isn't resident."""
+        key = (cover_hash, *thumb_resolution)
+
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.textures.move_to_end(key)
+            return texture
+
+        self.pending[key] = None
+        self.pending.move_to_end(key)
+
+        return None
+
+    def load(self, key: tuple):
+        cover_hash, width, height = key
+
+        thumb_data = get_thumbnail_pack().get(cover_hash, (width, height))
+        if not thumb_data: # compacted out of the pack, the Card keeps the placeholder until the file is scanned again
+            return None
+
+        # the cover hash names the atlas region, so arcade doesn't hash the pixels again, and thumbnails need no hit box
+        texture = arcade.Texture(
+            Image.frombytes("RGBA", (width, height), thumb_data),
+            hash=f"thumbnail-{cover_hash}-{width}x{height}",
+            hit_box_algorithm=arcade.hitbox.algo_bounding_box
+        )
+
+        self.textures[key] = texture
+        self.size += width * height * 4
+        self.loads += 1
+
+        return texture
+
+    def load_pending(self, time_budget: float):
+        """Loads queued covers for up to time_budget seconds, then evicts down to the byte budget. Returns the cover hashes that became resident."""
+        start_time = time.perf_counter()
+        loaded = set()
+
+        while self.pending and time.perf_counter() - start_time < time_budget:
+            key, _ = self.pending.popitem()
+
+            if not key in self.textures and self.load(key) is not None:
+                loaded.add(key[0])
+
+        if loaded:
+            self.evict()
+
+        return loaded
+
+    def evict(self):
+        while self.size > self.budget and len(self.textures) > 1:
+            (_, width, height), _ = self.textures.popitem(last=False)
+            self.size -= width * height * 4
+            self.evictions += 1
+            self.evictions_since_compact += 1
+
+    def compact(self, atlas):
+        """Rebuilds the atlas once enough textures were evicted, because it doesn't reuse the space they leave behind."""
+        if self.evictions_since_compact < self.compact_evictions:
+            return False
+
+        atlas.rebuild()
+        self.evictions_since_compact = 0
+        logging.debug(f"Compacted texture atlas: {len(self.textures)} thumbnails resident, {self.size / (1024 ** 2):.2f} MiB of {self.budget / (1024 ** 2):.2f} MiB")
+
+        return True
+
+    def clear(self):
+        self.textures.clear()
+        self.pending.clear()
+        self.size = 0
+
+texture_residency = None
+
+def get_texture_residency(budget: int | None=None):
+    global texture_residency
+
+    if texture_residency is None:
+        texture_residency = TextureResidency(budget or THUMBNAIL_MEMORY_BUDGET)
+    elif budget and texture_residency.budget != budget:
+        texture_residency.budget = budget
+        texture_residency.evict()
+
+    return texture_residency
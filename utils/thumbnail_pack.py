@@ -0,0 +1,208 @@
+import os, sys, mmap, struct, threading, hashlib
+
+from utils.constants import THUMBNAIL_PACK_PATH, THUMBNAIL_PACK_MAX_SIZE
+
+INDEX_RECORD = struct.Struct("<16sHHQI") # cover hash, width, height, offset, length
+
+def get_cover_hash(cover_data: bytes):
+    return hashlib.blake2b(cover_data, digest_size=16).hexdigest()
+
+class ThumbnailPack():
+    """Resized RGBA thumbnails in one append-only, memory-mapped pack file, keyed by the hash of the embedded cover and the thumbnail resolution."""
+    def __init__(self, path: str=THUMBNAIL_PACK_PATH, max_size: int=THUMBNAIL_PACK_MAX_SIZE):
+        self.path = path
+        self.index_path = f"{os.path.splitext(path)[0]}.idx"
+        self.max_size = max_size
+        self.lock = threading.RLock()
+
+        self.entries = {} # (cover hash, width, height) -> (offset, length), least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.map = None
+        self.mapped_size = 0
+
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_path): # the pack is useless without it
+            open(self.path, "wb").close()
+
+        pack_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+        try:
+            with open(self.index_path, "rb") as file:
+                index_data = file.read()
+        except OSError:
+            index_data = b""
+
+        for n in range(len(index_data) // INDEX_RECORD.size): # a torn last record is ignored
+            cover_hash, width, height, offset, length = INDEX_RECORD.unpack_from(index_data, n * INDEX_RECORD.size)
+            if offset + length > pack_size: # appended after the last complete pack write
+                break
+
+            self.entries[(cover_hash.hex(), width, height)] = (offset, length)
+            self.size = max(self.size, offset + length)
+
+        self.pack_file = open(self.path, "ab")
+        self.index_file = open(self.index_path, "ab")
+
+        if self.pack_file.tell() != self.size: # drop bytes no record points to
+            self.pack_file.truncate(self.size)
+            self.pack_file.seek(self.size)
+
+    def get_map(self):
+        if self.map is None or self.mapped_size < self.size:
+            self.close_map()
+
+            with open(self.path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped_size = len(self.map)
+
+        return self.map
+
+    def close_map(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.mapped_size = 0
+
+    def contains(self, cover_hash: str, thumb_resolution: tuple):
+        return (cover_hash, *thumb_resolution) in self.entries
+
+    def get_cover_hashes(self, thumb_resolution: tuple):
+        """Hashes of the covers the pack has at this resolution, for read_metadata in places that mustn't open the pack."""
+        with self.lock:
+            return set(cover_hash for cover_hash, width, height in self.entries if (width, height) == tuple(thumb_resolution))
+
+    def get(self, cover_hash: str, thumb_resolution: tuple):
+        key = (cover_hash, *thumb_resolution)
+
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries[key] = entry # now the most recently used
+            self.hits += 1
+
+            offset, length = entry
+            return self.get_map()[offset:offset + length]
+
+    def put(self, cover_hash: str, thumb_resolution: tuple, data: bytes):
+        key = (cover_hash, *thumb_resolution)
+
+        with self.lock:
+            if key in self.entries:
+                return
+
+            self.pack_file.write(data)
+            self.pack_file.flush()
+            self.index_file.write(INDEX_RECORD.pack(bytes.fromhex(cover_hash), thumb_resolution[0], thumb_resolution[1], self.size, len(data)))
+            self.index_file.flush()
+
+            self.entries[key] = (self.size, len(data))
+            self.size += len(data)
+
+            if self.size > self.max_size:
+                self.compact()
+
+    def compact(self, thumb_resolution: tuple | None=None):
+        """Rewrites the pack with the most recently used thumbnails that fit into three quarters of max_size. With a resolution, thumbnails of other sizes are dropped."""
+        with self.lock:
+            kept, kept_size = [], 0
+
+            for key, (offset, length) in reversed(self.entries.items()):
+                if thumb_resolution and key[1:] != tuple(thumb_resolution):
+                    continue
+                if kept_size + length > self.max_size * 3 // 4:
+                    break
+
+                kept.append((key, offset, length))
+                kept_size += length
+
+            kept.reverse()
+            pack_map = self.get_map() if self.size else None
+            entries, offset = {}, 0
+
+            with open(f"{self.path}.tmp", "wb") as pack_file, open(f"{self.index_path}.tmp", "wb") as index_file:
+                for key, old_offset, length in kept:
+                    pack_file.write(pack_map[old_offset:old_offset + length])
+                    index_file.write(INDEX_RECORD.pack(bytes.fromhex(key[0]), key[1], key[2], offset, length))
+                    entries[key] = (offset, length)
+                    offset += length
+
+            self.close()
+
+            os.remove(self.index_path) # a crash before the next replace only loses the cache
+            os.replace(f"{self.path}.tmp", self.path)
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+
+            self.pack_file = open(self.path, "ab")
+            self.index_file = open(self.index_path, "ab")
+            self.entries = entries
+            self.size = offset
+
+    def clear(self):
+        with self.lock:
+            self.close()
+
+            for path in [self.path, self.index_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+            self.entries = {}
+            self.size = 0
+            self.load()
+
+    def close(self):
+        with self.lock:
+            self.close_map()
+            self.pack_file.close()
+            self.index_file.close()
+
+thumbnail_pack = None
+
+def get_thumbnail_pack():
+    global thumbnail_pack
+
+    if thumbnail_pack is None:
+        thumbnail_pack = ThumbnailPack()
+
+    return thumbnail_pack
+
+if __name__ == "__main__": # python -m utils.thumbnail_pack stats|compact|rebuild
+    from utils.library_index import get_library_index, get_thumb_resolution_from_settings
+    from utils import thumbnail_pack as thumbnail_pack_module # the instance the library index writes to, not this __main__ copy
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    pack = thumbnail_pack_module.get_thumbnail_pack()
+
+    if command == "stats":
+        print(f"{len(pack.entries)} thumbnails, {pack.size / (1024 ** 2):.2f} MiB of {pack.max_size / (1024 ** 2):.2f} MiB.")
+
+        thumb_resolution = get_thumb_resolution_from_settings()
+        index = get_library_index()
+        cover_hashes = index.get_cover_hashes(thumb_resolution)
+        index.close()
+
+        unique_covers = set(cover_hashes)
+        packed_covers = sum(pack.contains(cover_hash, thumb_resolution) for cover_hash in unique_covers)
+        atlas_bytes_saved = (len(cover_hashes) - len(unique_covers)) * thumb_resolution[0] * thumb_resolution[1] * 4
+
+        print(f"{len(cover_hashes)} indexed tracks with covers at {thumb_resolution[0]}x{thumb_resolution[1]}, {len(unique_covers)} unique covers, {packed_covers} of them in the pack.")
+        print(f"Sharing textures saves {atlas_bytes_saved / (1024 ** 2):.2f} MiB of atlas when every track is shown.")
+    elif command == "compact": # drops thumbnails that don't match the current resolution
+        pack.compact(get_thumb_resolution_from_settings())
+        print(f"Kept {len(pack.entries)} thumbnails, {pack.size / (1024 ** 2):.2f} MiB.")
+    elif command == "rebuild":
+        pack.clear()
+        index = get_library_index()
+        print(f"Re-read {index.rebuild(get_thumb_resolution_from_settings())} files into {len(pack.entries)} thumbnails.")
+        index.close()
+    else:
+        print("Usage: python -m utils.thumbnail_pack [stats|compact|rebuild]")
+
+    pack.close()
@@ -0,0 +1,90 @@
+import os, threading
+
+class TrackIdentities():
+    """Maps every path a track is reached through (tab, playlist, symlink, ~) to one (st_dev, st_ino) identity and one canonical real path.
+    Where the filesystem has no inode numbers, the identity is (st_dev, normalized real path)."""
+    def __init__(self):
+        self.ids = {} # path -> (st_dev, st_ino)
+        self.paths = {} # (st_dev, st_ino) -> real path used for reading and decoding
+        self.aliases = {} # (st_dev, st_ino) -> every known path of it
+        self.real_directories = {} # directory -> its real path, so realpath runs once per directory instead of once per file
+        self.lock = threading.Lock() # used from the scan thread too
+
+    def get_stat_id(self, file_path: str, stat: os.stat_result | None):
+        if stat is None or not stat.st_ino: # os.DirEntry stats on Windows have no device or inode number, only os.stat fills them in
+            stat = os.stat(os.path.expanduser(file_path))
+
+        if not stat.st_ino: # a filesystem without file ids, the real path is all that's left
+            return (stat.st_dev, os.path.normcase(self.get_real_path(file_path)))
+
+        return (stat.st_dev, stat.st_ino)
+
+    def get_id(self, file_path: str, stat: os.stat_result | None=None):
+        track_id = self.ids.get(file_path)
+        if track_id is not None:
+            if stat is None or track_id == self.get_stat_id(file_path, stat):
+                return track_id
+
+            self.forget(file_path) # replaced by another file
+
+        track_id = self.get_stat_id(file_path, stat)
+
+        real_path = self.get_real_path(file_path)
+
+        with self.lock:
+            self.ids[file_path] = track_id
+            self.paths.setdefault(track_id, real_path)
+            self.aliases.setdefault(track_id, set()).add(file_path)
+
+        return track_id
+
+    def get_real_path(self, file_path: str):
+        file_path = os.path.expanduser(file_path)
+
+        if os.path.islink(file_path):
+            return os.path.realpath(file_path)
+
+        directory, filename = os.path.split(file_path)
+
+        real_directory = self.real_directories.get(directory)
+        if real_directory is None:
+            real_directory = self.real_directories[directory] = os.path.realpath(directory)
+
+        return os.path.join(real_directory, filename)
+
+    def find_id(self, file_path: str):
+        """Like get_id, but returns None instead of raising when the file is gone."""
+        try:
+            return self.get_id(file_path)
+        except OSError:
+            return None
+
+    def get_path(self, track_id: tuple):
+        return self.paths[track_id]
+
+    def get_canonical_path(self, file_path: str):
+        return self.paths[self.get_id(file_path)]
+
+    def forget(self, file_path: str):
+        """Drops a path after it was deleted or replaced. Returns its old identity, if it had one."""
+        with self.lock:
+            track_id = self.ids.pop(file_path, None)
+
+            if track_id is not None:
+                self.aliases[track_id].discard(file_path)
+
+                if not self.aliases[track_id]:
+                    del self.aliases[track_id]
+                    del self.paths[track_id]
+
+        return track_id
+
+track_identities = None
+
+def get_track_identities():
+    global track_identities
+
+    if track_identities is None:
+        track_identities = TrackIdentities()
+
+    return track_identities
@@ -1,8 +1,11 @@
-import logging, sys, traceback, pyglet, arcade, arcade.gui, textwrap, os, json
+import logging, sys, traceback, pyglet, arcade, arcade.gui, textwrap, math
 
 from utils.constants import menu_background_color
 
-from arcade.gui.experimental.scroll_area import UIScrollArea
+from arcade import XYWH
+from arcade.types import LBWH
+from arcade.gui.property import Property, bind
+from arcade.gui.experimental.scroll_area import UIScrollArea, UIScrollBar
 
 def dump_platform():
     import platform
@@ -130,6 +133,15 @@ class Card(arcade.gui.UIBoxLayout):
                 text_color=arcade.color.GRAY
             ))
 
+    def set_content(self, thumbnail, line_1: str, line_2: str):
+        self.button.texture = thumbnail
+        self.button.texture_hovered = thumbnail
+
+        if hasattr(self, "line_1_label"):
+            self.line_1_label.text = line_1 or ""
+        if hasattr(self, "line_2_label"):
+            self.line_2_label.text = line_2 or ""
+
     def on_event(self, event: arcade.gui.UIEvent):
         if isinstance(event, UIMouseOutOfAreaEvent):
             # not hovering
@@ -151,6 +163,180 @@ class Card(arcade.gui.UIBoxLayout):
 
         return super().on_event(event)
 
+class VirtualScrollArea(MouseAwareScrollArea):
+    """Scroll area whose child only covers part of the content. virtual_height is the full content height, virtual_offset is where the child starts in it."""
+    virtual_height = Property(0.0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.virtual_offset = 0
+
+    def _get_scroll_offset(self):
+        offset_x, offset_y = super()._get_scroll_offset()
+        return offset_x, offset_y - self.virtual_offset
+
+    def clamp_scroll(self):
+        self.scroll_y = max(min(0, self.scroll_y), min(0, self.content_height - self.virtual_height))
+
+    def do_layout(self):
+        scroll_x, scroll_y = self.scroll_x, self.scroll_y
+        super().do_layout() # resets the scroll position whenever the surface is resized
+        self.scroll_x, self.scroll_y = scroll_x, scroll_y
+
+    def on_event(self, event: arcade.gui.UIEvent):
+        if isinstance(event, arcade.gui.UIMouseScrollEvent) and self.rect.point_in_rect(event.pos):
+            invert = -1 if self.invert_scroll else 1
+            self.scroll_y -= event.scroll_y * self.scroll_speed * invert
+            self.clamp_scroll()
+            return True
+
+        return super().on_event(event)
+
+class VirtualScrollBar(UIScrollBar):
+    """Vertical scroll bar for a VirtualScrollArea, sized by the virtual height instead of the surface."""
+    def __init__(self, scroll_area: VirtualScrollArea):
+        super().__init__(scroll_area)
+        bind(scroll_area, "virtual_height", self.trigger_full_render)
+
+    def _scroll_range(self):
+        return self.scroll_area.virtual_height - self.scroll_area.content_height
+
+    def _scrollable(self):
+        return self._scroll_range() > 0
+
+    def _scroll_bar_size(self):
+        ratio = self.scroll_area.content_height / max(1, self.scroll_area.virtual_height)
+        return min(self.content_height, max(20, self.content_height * ratio))
+
+    def _thumb_rect(self):
+        if not self._scrollable():
+            return LBWH(0, 0, self.content_width, self.content_height)
+
+        scroll_progress = -self.scroll_area.scroll_y / self._scroll_range()
+        available_track_size = self.content_height - self._scroll_bar_size()
+
+        return XYWH(self.content_width / 2, self._scroll_bar_size() / 2 + available_track_size * (1 - scroll_progress), self.content_width, self._scroll_bar_size())
+
+    def on_event(self, event: arcade.gui.UIEvent):
+        if isinstance(event, arcade.gui.UIMouseDragEvent) and self._dragging and self._scrollable():
+            sy = event.y - self.bottom - self._scroll_bar_size() / 2
+            target_progress = max(0, min(1, 1 - sy / (self.content_height - self._scroll_bar_size())))
+            self.scroll_area.scroll_y = -target_progress * self._scroll_range()
+            return True
+
+        return super().on_event(event)
+
+class VirtualGrid(arcade.gui.UIGridLayout):
+    """Grid of Cards inside a VirtualScrollArea. Only the Cards for the rows in view (plus a margin) exist, they get re-bound to other items while scrolling."""
+    def __init__(self, scroll_area: VirtualScrollArea, column_count: int, card_width: float, view_height: float, bind_card, margin_rows: int=1, horizontal_spacing: int=10, vertical_spacing: int=10):
+        self.scroll_area = scroll_area
+        self.bind_card = bind_card
+        self.margin_rows = margin_rows
+        self.items = []
+        self.first_row = 0
+
+        # measure a Card with the maximum amount of text lines, all Cards get that height so every row is the same
+        measure_card = Card(None, "\n".join(["-"] * 3), "\n".join(["-"] * 2), width=card_width, height=card_width)
+        measure_card._update_size_hints()
+        self.card_width, self.card_height = card_width, measure_card.size_hint_min[1]
+        self.row_height = self.card_height + vertical_spacing
+
+        self.pool_rows = math.ceil(view_height / self.row_height) + margin_rows * 2
+
+        super().__init__(column_count=column_count, row_count=self.pool_rows, horizontal_spacing=horizontal_spacing, vertical_spacing=vertical_spacing)
+
+        self.cards = []
+        for n in range(self.pool_rows * column_count):
+            card = self.add(measure_card if n == 0 else Card(None, " ", " ", width=card_width, height=card_width), row=n // column_count, column=n % column_count)
+            card.size_hint = None
+            card.rect = card.rect.resize(width=self.card_width, height=self.card_height)
+            self.cards.append(card)
+
+        bind(scroll_area, "scroll_y", self.update_visible_rows)
+
+    def set_items(self, items: list):
+        self.items = items
+
+        self.update_virtual_height()
+        self.scroll_area.scroll_y = 0
+
+        self.update_visible_rows(force=True)
+
+    def update_virtual_height(self):
+        total_rows = math.ceil(len(self.items) / self.column_count)
+        self.scroll_area.virtual_height = max(0, total_rows * self.row_height - (self.row_height - self.card_height))
+
+    def is_index_in_view(self, index: int):
+        return index < (self.first_row + self.pool_rows) * self.column_count
+
+    def insert_item(self, index: int, item):
+        self.items.insert(index, item)
+        self.update_virtual_height()
+
+        if self.is_index_in_view(index): # Cards after the index shift by one, Cards further down don't exist yet
+            self.update_visible_rows(force=True)
+
+    def add_item(self, item):
+        self.insert_item(len(self.items), item)
+
+    def add_items(self, items: list):
+        start = len(self.items)
+        self.items.extend(items)
+        self.update_virtual_height()
+
+        # only Cards that were empty can get one of the new items, the others keep theirs
+        for n, card in enumerate(self.cards):
+            index = self.first_row * self.column_count + n
+            if start <= index < len(self.items):
+                card.visible = True
+                self.bind_card(card, self.items[index])
+
+        self.scroll_area.trigger_full_render()
+
+    def remove_item(self, item):
+        if not item in self.items:
+            return
+
+        index = self.items.index(item)
+        self.items.pop(index)
+
+        self.update_virtual_height()
+        self.scroll_area.clamp_scroll()
+
+        if self.is_index_in_view(index):
+            self.update_visible_rows(force=True)
+
+    def refresh_item(self, item):
+        self.refresh_matching(lambda other_item: other_item == item)
+
+    def refresh_matching(self, predicate):
+        for n, card in enumerate(self.cards):
+            index = self.first_row * self.column_count + n
+            if index < len(self.items) and predicate(self.items[index]):
+                self.bind_card(card, self.items[index])
+
+    def update_visible_rows(self, force: bool=False):
+        total_rows = math.ceil(len(self.items) / self.column_count)
+        first_row = int(-self.scroll_area.scroll_y // self.row_height) - self.margin_rows
+        first_row = max(0, min(first_row, total_rows - self.pool_rows))
+
+        if first_row == self.first_row and not force:
+            return
+
+        self.first_row = first_row
+        self.scroll_area.virtual_offset = first_row * self.row_height
+
+        for n, card in enumerate(self.cards):
+            index = first_row * self.column_count + n
+            if index < len(self.items):
+                card.visible = True
+                self.bind_card(card, self.items[index])
+            else:
+                card.visible = False
+                card.button.on_click = lambda event: None
+
+        self.scroll_area.trigger_full_render()
+
 def on_exception(*exc_info):
     logging.error(f"Unhandled exception:\n{''.join(traceback.format_exception(exc_info[1], limit=None))}")
 
@@ -188,27 +374,13 @@ def convert_seconds_to_date(seconds):
 
     return result.strip()
 
-def get_wordwrapped_text(text, width=18):
+def get_wordwrapped_text(text, width=18, max_lines=None):
     if len(text) < width:
         output_text = text.center(width)
     elif len(text) == width:
         output_text = text
     else:
-        output_text = '\n'.join(textwrap.wrap(text, width=width))
-
-    return output_text
+        lines = textwrap.wrap(text, width=width, max_lines=max_lines, placeholder="...") if max_lines else textwrap.wrap(text, width=width)
+        output_text = '\n'.join(lines)
 
-def ensure_metadata_file():
-    if os.path.exists("metadata_cache.json") and os.path.isfile("metadata_cache.json"):
-        with open("metadata_cache.json", "r") as file:
-            metadata_cache = json.load(file)
-    else:
-        metadata_cache = {
-            "query_results": {},
-            "recording_by_id": {},
-            "artist_by_id": {},
-            "lyrics_by_artist_title": {},
-            "album_by_id": {}
-        }
-
-    return metadata_cache
\ No newline at end of file
+    return output_text
\ No newline at end of file